@@ -0,0 +1,258 @@
+## benchmark of s3helper operations against a local S3-compatible server (eg moto server or MinIO)
+##
+##   python benchmarks/benchmark.py --host localhost --port 5000 --output results.json
+##   python benchmarks/benchmark.py --server_command 'moto_server -p 5000' --compare results.json
+##
+## a synthetic bucket of many small keys under deep prefixes and a few large keys is built and each
+## operation runs in its own process so that its peak RSS is its own - results are written as JSON
+import argparse
+import json
+import os
+import platform
+import resource
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inst', 'python'))
+
+import boto
+import s3helper
+
+## operations in the order they run, later operations use the keys uploaded by earlier ones
+OPERATIONS = ['upload_files', 'upload_file', 'get_keys', 'get_keys_sharded', 'download_files', 'download_file_ranges', 'copy_file', 'copy_files', 'delete_keys']
+
+def get_small_file_name(index, depth, fanout):
+    dirs = ['l{0}-{1}'.format(level, (index // fanout ** level) % fanout) for level in range(depth)]
+    return os.path.join(*(dirs + ['f{0:07d}'.format(index)]))
+
+def write_data(data_path, args):
+    block = os.urandom(1024 * 1024)
+    for index in range(args.small_keys):
+        full_path = os.path.join(data_path, 'small', get_small_file_name(index, args.depth, args.fanout))
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, 'wb') as f:
+            f.write(block[index % 1024:index % 1024 + args.small_size])
+    os.makedirs(os.path.join(data_path, 'large'))
+    for index in range(args.large_keys):
+        with open(os.path.join(data_path, 'large', 'large-{0}.bin'.format(index)), 'wb') as f:
+            remaining = args.large_size
+            while remaining > 0:
+                f.write(block[:min(remaining, len(block))])
+                remaining -= len(block)
+
+def get_dir_size(dir_path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(dir_path) for name in files)
+
+## upload_file and upload_files prefix key names with '/', which some servers keep as part of the name
+def find_prefix(conn_res, bucket_name, name):
+    bucket_res = s3helper.get_bucket_response(conn_res, bucket_name)
+    for prefix in [name + '/', '/' + name + '/']:
+        if len(next(s3helper.get_bucket_list_pages(s3helper.get_bucket_list_response(bucket_res, prefix)))) > 0:
+            return prefix
+    return name + '/'
+
+def count_ok(responses, flag):
+    return sum(1 for response in responses if response.get(flag))
+
+def run_upload_files(conn_res, args):
+    small_path = os.path.join(args.data_path, 'small')
+    responses = s3helper.upload_files(conn_res, args.bucket_name, small_path, 'small', args.max_workers)
+    return (count_ok(responses, 'is_uploaded'), get_dir_size(small_path), len(responses))
+
+def run_upload_file(conn_res, args):
+    large_path = os.path.join(args.data_path, 'large')
+    responses = [s3helper.upload_file(conn_res, args.bucket_name, large_path, file_name, 'large', args.part_size, args.part_size, args.max_workers) for file_name in sorted(os.listdir(large_path))]
+    return (count_ok(responses, 'is_uploaded'), get_dir_size(large_path), len(responses))
+
+def run_get_keys(conn_res, args, list_workers = 1):
+    bucket_res = s3helper.get_bucket_response(conn_res, args.bucket_name)
+    responses = s3helper.get_keys(s3helper.get_bucket_list_response(bucket_res, args.small_prefix), list_workers)
+    return (sum(1 for response in responses if response['key_name'] is not None), 0, len(responses))
+
+def run_download_files(conn_res, args, name = 'small', multipart_threshold = None):
+    download_path = tempfile.mkdtemp(prefix='rs3bench-')
+    try:
+        responses = s3helper.download_files(conn_res, args.bucket_name, download_path, prefix=getattr(args, name + '_prefix'), max_workers=args.max_workers, multipart_threshold=multipart_threshold, part_size=args.part_size)
+        result = (count_ok(responses, 'is_downloaded'), get_dir_size(download_path), len(responses))
+    finally:
+        shutil.rmtree(download_path)
+    return result
+
+def run_copy_file(conn_res, args):
+    bucket_res = s3helper.get_bucket_response(conn_res, args.bucket_name)
+    pages = s3helper.get_bucket_list_pages(s3helper.get_bucket_list_response(bucket_res, args.small_prefix))
+    keys = next(pages)[:args.copy_keys]
+    responses = [s3helper.copy_file(conn_res, args.bucket_name, key.name, args.bucket_name, 'copy-one/' + key.name.lstrip('/')) for key in keys]
+    return (count_ok(responses, 'is_copied'), sum(key.size for key in keys), len(responses))
+
+def run_copy_files(conn_res, args):
+    responses = s3helper.copy_files(conn_res, args.bucket_name, args.bucket_name, args.small_prefix, 'copy-all/', max_workers=args.max_workers)
+    return (count_ok(responses, 'is_copied'), args.small_keys * args.small_size, len(responses))
+
+def run_delete_keys(conn_res, args):
+    response = s3helper.delete_keys(conn_res, args.bucket_name, prefix=args.small_prefix, max_workers=args.max_workers)
+    return (response['num_keys'] or 0, 0, response['num_keys'] or 0)
+
+RUNNERS = {
+    'upload_files': run_upload_files,
+    'upload_file': run_upload_file,
+    'get_keys': run_get_keys,
+    'get_keys_sharded': lambda conn_res, args: run_get_keys(conn_res, args, args.max_workers),
+    'download_files': run_download_files,
+    'download_file_ranges': lambda conn_res, args: run_download_files(conn_res, args, 'large', args.part_size),
+    'copy_file': run_copy_file,
+    'copy_files': run_copy_files,
+    'delete_keys': run_delete_keys
+}
+
+def get_peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def get_connection(args):
+    return s3helper.get_connection_response(args.access_key_id, args.secret_access_key, True, None, args.host, args.port, args.is_secure)
+
+## runs a single operation in this process and prints its result as a line of JSON
+def run_operation(op, args):
+    s3helper.enable_metrics()
+    conn_res = get_connection(args)
+    args.small_prefix = find_prefix(conn_res, args.bucket_name, 'small')
+    args.large_prefix = find_prefix(conn_res, args.bucket_name, 'large')
+    s3helper.invalidate_cached_metadata(conn_res[0].host, args.bucket_name)
+    s3helper.reset_metrics()
+    start = time.time()
+    num_ok, num_bytes, num_items = RUNNERS[op](conn_res, args)
+    seconds = time.time() - start
+    metrics = s3helper.get_metrics_summary()
+    return {
+        'op': op,
+        'seconds': round(seconds, 6),
+        'items': num_items,
+        'ok': num_ok,
+        'ops_per_sec': round(num_ok / seconds, 3) if seconds > 0 else None,
+        'bytes': num_bytes,
+        'mb_per_sec': round(num_bytes / 1024.0 / 1024.0 / seconds, 3) if seconds > 0 and num_bytes > 0 else None,
+        'list_pages': metrics['calls'].get('list', 0),
+        'requests': sum(metrics['requests'].values()),
+        'requests_by_method': metrics['requests'],
+        'retries': metrics['retries'],
+        'errors': metrics['errors'],
+        'peak_rss_kb': get_peak_rss_kb()
+    }
+
+def wait_for_server(host, port, timeout = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), 1).close()
+            return True
+        except socket.error:
+            time.sleep(0.2)
+    return False
+
+def get_child_args(args, op):
+    child_args = [sys.executable, os.path.abspath(__file__), '--run', op, '--bucket_name', args.bucket_name, '--data_path', args.data_path]
+    for name in ['access_key_id', 'secret_access_key', 'host', 'port', 'small_keys', 'small_size', 'large_keys', 'large_size', 'depth', 'fanout', 'part_size', 'max_workers', 'copy_keys']:
+        child_args += ['--' + name, str(getattr(args, name))]
+    if not args.is_secure:
+        child_args.append('--is_insecure')
+    return child_args
+
+def run_suite(args):
+    server = subprocess.Popen(shlex.split(args.server_command)) if args.server_command else None
+    data_path = tempfile.mkdtemp(prefix='rs3bench-data-')
+    try:
+        if not wait_for_server(args.host, args.port):
+            raise SystemExit('S3 server is not reachable at {0}:{1}'.format(args.host, args.port))
+        args.bucket_name = args.bucket_name or 'rs3bench-{0}'.format(int(time.time()))
+        args.data_path = data_path
+        write_data(data_path, args)
+        conn_res = get_connection(args)
+        created = s3helper.create_bucket(conn_res, args.bucket_name)
+        if not created['is_created']:
+            raise SystemExit(created['message'])
+        results = []
+        for op in args.operations:
+            for repeat in range(args.repeat):
+                output = subprocess.check_output(get_child_args(args, op))
+                result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+                result['repeat'] = repeat
+                results.append(result)
+                sys.stderr.write('{0:<22} {1:>9.3f}s {2:>10} ops/s {3:>10} MB/s {4:>6} pages {5:>9} KB\n'.format(op, result['seconds'], result['ops_per_sec'], result['mb_per_sec'], result['list_pages'], result['peak_rss_kb']))
+        s3helper.delete_bucket(conn_res, args.bucket_name, args.max_workers)
+    finally:
+        shutil.rmtree(data_path)
+        if server is not None:
+            server.terminate()
+            server.wait()
+    config = dict((name, getattr(args, name)) for name in ['host', 'port', 'small_keys', 'small_size', 'large_keys', 'large_size', 'depth', 'fanout', 'part_size', 'max_workers', 'copy_keys', 'repeat'])
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'boto': boto.__version__,
+        'platform': platform.platform(),
+        'config': config,
+        'results': results
+    }
+
+## ratio of each operation's ops/sec and MB/s over a previous run, best of repeats
+def compare_runs(run, baseline):
+    def best(results):
+        best_results = {}
+        for result in results:
+            if result['op'] not in best_results or result['seconds'] < best_results[result['op']]['seconds']:
+                best_results[result['op']] = result
+        return best_results
+    current, previous = best(run['results']), best(baseline['results'])
+    comparison = []
+    for op in [op for op in OPERATIONS if op in current and op in previous]:
+        ratio = lambda name: round(current[op][name] / previous[op][name], 3) if current[op][name] and previous[op][name] else None
+        comparison.append({'op': op, 'seconds': current[op]['seconds'], 'baseline_seconds': previous[op]['seconds'], 'ops_per_sec_ratio': ratio('ops_per_sec'), 'mb_per_sec_ratio': ratio('mb_per_sec')})
+    return comparison
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark s3helper operations against a local S3-compatible server')
+    parser.add_argument('--host', required=False, type=str, default='localhost', help='S3 server host')
+    parser.add_argument('--port', required=False, type=int, default=5000, help='S3 server port')
+    parser.add_argument('--is_insecure', required=False, dest='is_secure', action='store_false', help='Connect by HTTP instead of HTTPS?')
+    parser.add_argument('--access_key_id', required=False, type=str, default='benchmark', help='Access key id of the server')
+    parser.add_argument('--secret_access_key', required=False, type=str, default='benchmark', help='Secret access key of the server')
+    parser.add_argument('--server_command', required=False, type=str, help='Command that starts a server for the run, eg moto_server -p 5000')
+    parser.add_argument('--bucket_name', required=False, type=str, help='Bucket to create for the run')
+    parser.add_argument('--operations', required=False, type=str, nargs='+', default=OPERATIONS, choices=OPERATIONS, help='Operations to run')
+    parser.add_argument('--small_keys', required=False, type=int, default=2000, help='Number of small keys')
+    parser.add_argument('--small_size', required=False, type=int, default=1024, help='Size of a small key in bytes')
+    parser.add_argument('--large_keys', required=False, type=int, default=2, help='Number of large keys')
+    parser.add_argument('--large_size', required=False, type=int, default=64 * 1024 * 1024, help='Size of a large key in bytes')
+    parser.add_argument('--depth', required=False, type=int, default=3, help='Depth of prefixes of small keys')
+    parser.add_argument('--fanout', required=False, type=int, default=8, help='Number of prefixes at each depth')
+    parser.add_argument('--part_size', required=False, type=int, default=s3helper.DEFAULT_PART_SIZE, help='Part size of large keys in bytes')
+    parser.add_argument('--max_workers', required=False, type=int, default=8, help='Number of concurrent requests')
+    parser.add_argument('--copy_keys', required=False, type=int, default=200, help='Number of keys copied one by one by copy_file')
+    parser.add_argument('--repeat', required=False, type=int, default=1, help='Number of runs of each operation')
+    parser.add_argument('--output', required=False, type=str, help='File to write results to, stdout by default')
+    parser.add_argument('--compare', required=False, type=str, help='Results of a previous run to compare with')
+    parser.add_argument('--run', required=False, type=str, choices=OPERATIONS, help=argparse.SUPPRESS)
+    parser.add_argument('--data_path', required=False, type=str, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.run is not None:
+        print(json.dumps(run_operation(args.run, args), sort_keys=True))
+    else:
+        run = run_suite(args)
+        if args.compare is not None:
+            with open(args.compare) as f:
+                run['comparison'] = compare_runs(run, json.load(f))
+        output = json.dumps(run, sort_keys=True, indent=4, separators=(',', ': '))
+        if args.output is not None:
+            with open(args.output, 'w') as f:
+                f.write(output + '\n')
+        else:
+            print(output)
@@ -0,0 +1,110 @@
+## startup time of the inst/python scripts, measured by launching each one as R does
+##
+##   python benchmarks/startup.py --output startup.json
+##   python benchmarks/startup.py --compare startup.json --check
+##
+## metadata scripts run in full and are tracked against --target_ms, the others run with --help so that only
+## their imports are measured - they import boto through s3helper and are timed for reference, not tracked
+## scripts run from a copy of inst/python, with and without compiled bytecode
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PYTHON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'inst', 'python')
+
+## scripts that answer without a connection and should start within the target
+METADATA_SCRIPTS = ['lookup_location.py', 'lookup_region.py']
+
+def get_scripts():
+    return sorted(name for name in os.listdir(PYTHON_PATH) if name.endswith('.py') and name not in ['s3helper.py', 's3tables.py'])
+
+## a script that fails to start is reported with its exit status instead of times
+def time_command(command, env, repeat):
+    times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(repeat):
+            start = time.time()
+            status = subprocess.call(command, stdout=devnull, stderr=devnull, env=env)
+            if status != 0:
+                return {'median_ms': None, 'min_ms': None, 'max_ms': None, 'error': 'exit status {0}'.format(status)}
+            times.append((time.time() - start) * 1000)
+    times.sort()
+    return {'median_ms': round(times[len(times) // 2], 3), 'min_ms': round(times[0], 3), 'max_ms': round(times[-1], 3), 'error': None}
+
+## bytecode: .pyc files are compiled beforehand, source: every launch compiles the modules it imports,
+## as it happens when the installed package directory is not writable
+def run_suite(args):
+    script_path = tempfile.mkdtemp(prefix='rs3startup-')
+    results = []
+    try:
+        for name in os.listdir(PYTHON_PATH):
+            if name.endswith('.py'):
+                shutil.copy(os.path.join(PYTHON_PATH, name), script_path)
+        baseline = time_command([args.python, '-c', 'pass'], dict(os.environ), args.repeat)
+        for mode in ['source', 'bytecode']:
+            env = dict(os.environ)
+            if mode == 'source':
+                env['PYTHONDONTWRITEBYTECODE'] = '1'
+            else:
+                env.pop('PYTHONDONTWRITEBYTECODE', None)
+                subprocess.check_call([args.python, '-m', 'compileall', '-q', script_path])
+            for name in args.scripts or get_scripts():
+                is_metadata = name in METADATA_SCRIPTS
+                command = [args.python, os.path.join(script_path, name)] + ([] if is_metadata else ['--help'])
+                result = dict(time_command(command, env, args.repeat), script=name, mode=mode, is_metadata=is_metadata)
+                if is_metadata:
+                    result['target_ms'] = args.target_ms
+                    result['meets_target'] = result['median_ms'] is not None and result['median_ms'] <= args.target_ms
+                results.append(result)
+                elapsed = '{0:>9.1f} ms'.format(result['median_ms']) if result['median_ms'] is not None else result['error']
+                sys.stderr.write('{0:<32} {1:<9} {2}{3}\n'.format(name, mode, elapsed, '' if not is_metadata else ' (target {0} ms)'.format(args.target_ms)))
+    finally:
+        shutil.rmtree(script_path)
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': subprocess.check_output([args.python, '-c', 'import platform; print(platform.python_version())']).decode('utf-8').strip(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'interpreter_ms': baseline['median_ms'],
+        'results': results
+    }
+
+def compare_runs(run, baseline):
+    previous = dict(((result['script'], result['mode']), result) for result in baseline['results'])
+    comparison = []
+    for result in run['results']:
+        before = previous.get((result['script'], result['mode']))
+        if before is not None and before['median_ms'] and result['median_ms']:
+            comparison.append({'script': result['script'], 'mode': result['mode'], 'median_ms': result['median_ms'], 'baseline_median_ms': before['median_ms'], 'ratio': round(result['median_ms'] / before['median_ms'], 3)})
+    return comparison
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='measure startup time of the rs3helper scripts')
+    parser.add_argument('--python', required=False, type=str, default='python', help='Python interpreter that runs the scripts')
+    parser.add_argument('--scripts', required=False, type=str, nargs='+', help='Scripts to measure, all by default')
+    parser.add_argument('--repeat', required=False, type=int, default=15, help='Number of launches of each script')
+    parser.add_argument('--target_ms', required=False, type=float, default=50, help='Target median startup time of metadata scripts in milliseconds')
+    parser.add_argument('--check', required=False, action='store_true', help='Exit with status 1 if a metadata script misses the target')
+    parser.add_argument('--output', required=False, type=str, help='File to write results to, stdout by default')
+    parser.add_argument('--compare', required=False, type=str, help='Results of a previous run to compare with')
+
+    args = parser.parse_args()
+
+    run = run_suite(args)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            run['comparison'] = compare_runs(run, json.load(f))
+    output = json.dumps(run, sort_keys=True, indent=4, separators=(',', ': '))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.check and not all(result['meets_target'] for result in run['results'] if result['is_metadata']):
+        sys.exit(1)
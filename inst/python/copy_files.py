@@ -0,0 +1,27 @@
+import json
+import argparse
+
+from s3helper import get_connection_response, copy_files, DEFAULT_COPY_PART_SIZE, attach_metrics
+
+parser = argparse.ArgumentParser(description='copy keys under a prefix')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--src_bucket_name', required=True, type=str, help='S3 bucket name - source')
+parser.add_argument('--dst_bucket_name', required=True, type=str, help='S3 bucket name - destination')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix - source')
+parser.add_argument('--dst_prefix', required=False, type=str, help='S3 prefix - destination')
+parser.add_argument('--pattern', required=False, type=str, help='Regular expression that filters key names')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent copies')
+parser.add_argument('--multipart_threshold', required=False, type=int, help='Size in bytes from which a key is copied in parts')
+parser.add_argument('--part_size', required=False, type=int, default=DEFAULT_COPY_PART_SIZE, help='Size of a part in bytes')
+parser.add_argument('--preserve_acl', required=False, type=bool, help='Copy ACL of source keys?')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+response = copy_files(conn_res, args.src_bucket_name, args.dst_bucket_name, args.prefix, args.dst_prefix, args.pattern, args.max_workers, args.multipart_threshold, args.part_size, bool(args.preserve_acl))
+
+response = attach_metrics(response, 'copy_files')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
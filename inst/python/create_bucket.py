@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, create_bucket
+from s3helper import get_connection_response, create_bucket, attach_metrics
 
 parser = argparse.ArgumentParser(description='create a bucket')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -16,4 +16,5 @@ args = parser.parse_args()
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
 response = create_bucket(conn_res, args.bucket_name, args.location)
 
+response = attach_metrics(response, 'create_bucket')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
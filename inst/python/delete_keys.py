@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, delete_keys
+from s3helper import get_connection_response, delete_keys, attach_metrics
 
 parser = argparse.ArgumentParser(description='delete a key')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -9,12 +9,23 @@ parser.add_argument('--secret_access_key', required=True, type=str, help='AWS se
 parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
 parser.add_argument('--key_name', required=False, type=str, help='S3 key name')
 parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--pattern', required=False, type=str, help='Regex that key names are searched for')
+parser.add_argument('--glob', required=False, type=str, help='Shell pattern that whole key names match, eg logs/2016-*.gz')
+parser.add_argument('--min_size', required=False, type=int, help='Minimum key size in bytes')
+parser.add_argument('--max_size', required=False, type=int, help='Maximum key size in bytes')
+parser.add_argument('--modified_since', required=False, type=str, help='Keys modified at or after this UTC date or timestamp, eg 2016-01-31T12:00:00')
+parser.add_argument('--modified_before', required=False, type=str, help='Keys modified before this UTC date or timestamp')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent delete requests')
+parser.add_argument('--list_workers', required=False, type=int, default=1, help='Number of concurrent listing requests over prefix shards')
+parser.add_argument('--shards', required=False, type=str, nargs='*', help='Key names that split the listing into shards')
+parser.add_argument('--journal_path', required=False, type=str, help='Journal file of a prefix deletion, resumed if it exists')
 parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
 parser.add_argument('--region', required=False, type=str, help='Region info')
 
 args = parser.parse_args()
 
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
-response = delete_keys(conn_res, args.bucket_name, args.key_name, args.prefix)
+response = delete_keys(conn_res, args.bucket_name, args.key_name, args.prefix, args.max_workers, args.list_workers, args.shards, args.journal_path, args.pattern, args.glob, args.min_size, args.max_size, args.modified_since, args.modified_before)
 
+response = attach_metrics(response, 'delete_keys')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, download_files
+from s3helper import get_connection_response, download_files, DEFAULT_PART_SIZE, attach_metrics
 
 parser = argparse.ArgumentParser(description='download files')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -9,14 +9,28 @@ parser.add_argument('--secret_access_key', required=True, type=str, help='AWS se
 parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
 parser.add_argument('--file_path', required=False, type=str, help='File path')
 parser.add_argument('--key_name', required=False, type=str, help='S3 key name')
-parser.add_argument('--pattern', required=False, type=str, help='S3 prefix')
+parser.add_argument('--pattern', required=False, type=str, help='Regex that key names are searched for')
+parser.add_argument('--glob', required=False, type=str, help='Shell pattern that whole key names match, eg logs/2016-*.gz')
+parser.add_argument('--min_size', required=False, type=int, help='Minimum key size in bytes')
+parser.add_argument('--max_size', required=False, type=int, help='Maximum key size in bytes')
+parser.add_argument('--modified_since', required=False, type=str, help='Keys modified at or after this UTC date or timestamp, eg 2016-01-31T12:00:00')
+parser.add_argument('--modified_before', required=False, type=str, help='Keys modified before this UTC date or timestamp')
 parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent downloads')
+parser.add_argument('--multipart_threshold', required=False, type=int, help='Size in bytes from which a key is downloaded in parallel byte ranges')
+parser.add_argument('--part_size', required=False, type=int, default=DEFAULT_PART_SIZE, help='Size of a byte range in bytes')
+parser.add_argument('--list_workers', required=False, type=int, default=1, help='Number of concurrent listing requests over prefix shards')
+parser.add_argument('--shards', required=False, type=str, nargs='*', help='Key names that split the listing into shards')
+parser.add_argument('--skip_decompression', required=False, type=bool, help='Keep gzip or zstd Content-Encoding contents compressed?')
+parser.add_argument('--journal_path', required=False, type=str, help='Journal file of a listed download, resumed if it exists')
+parser.add_argument('--skip_verification', required=False, type=bool, help='Skip verifying contents against their ETag?')
 parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
 parser.add_argument('--region', required=False, type=str, help='Region info')
 
 args = parser.parse_args()
 
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
-response = download_files(conn_res, args.bucket_name, args.file_path, args.key_name, args.pattern, args.prefix)
+response = download_files(conn_res, args.bucket_name, args.file_path, args.key_name, args.pattern, args.prefix, args.max_workers, args.multipart_threshold, args.part_size, args.list_workers, args.shards, not args.skip_decompression, args.journal_path, not args.skip_verification, args.glob, args.min_size, args.max_size, args.modified_since, args.modified_before)
 
+response = attach_metrics(response, 'download_files')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
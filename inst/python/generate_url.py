@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, get_bucket_response, generate_url
+from s3helper import get_connection_response, get_bucket_response, generate_url, attach_metrics
 
 parser = argparse.ArgumentParser(description='generate url')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -9,13 +9,15 @@ parser.add_argument('--secret_access_key', required=True, type=str, help='AWS se
 parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
 parser.add_argument('--key_name', required=True, type=str, help='S3 key name')
 parser.add_argument('--seconds', required=True, type=int, help='Seconds to keep a url')
+parser.add_argument('--skip_validation', required=False, type=bool, help='Skip checking that buckets and keys exist?')
 parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
 parser.add_argument('--region', required=False, type=str, help='Region info')
 
 args = parser.parse_args()
 
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
-bucket_res = get_bucket_response(conn_res, args.bucket_name)
-response = generate_url(bucket_res, args.key_name, args.seconds)
+bucket_res = get_bucket_response(conn_res, args.bucket_name, not args.skip_validation)
+response = generate_url(bucket_res, args.key_name, args.seconds, not args.skip_validation)
 
+response = attach_metrics(response, 'generate_url')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
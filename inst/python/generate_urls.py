@@ -0,0 +1,25 @@
+import json
+import argparse
+
+from s3helper import get_connection_response, generate_urls, read_key_names, attach_metrics
+
+parser = argparse.ArgumentParser(description='generate urls of many keys')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--seconds', required=True, type=int, help='Seconds to keep a url')
+parser.add_argument('--key_file', required=False, type=str, help='File of key names, one per line, - for stdin')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix of keys to list when key_file is not given')
+parser.add_argument('--check_exists', required=False, type=bool, help='Check that keys exist?')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent existence checks')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+key_names = read_key_names(args.key_file) if args.key_file is not None else None
+response = generate_urls(conn_res, args.bucket_name, args.seconds, key_names, args.prefix, bool(args.check_exists), args.max_workers)
+
+response = attach_metrics(response, 'generate_urls')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
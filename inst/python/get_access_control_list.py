@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, get_access_control_list
+from s3helper import get_connection_response, get_access_control_list, attach_metrics
 
 parser = argparse.ArgumentParser(description='get access control list of a bucket or key')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -16,4 +16,5 @@ args = parser.parse_args()
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
 response = get_access_control_list(conn_res, args.bucket_name, args.key_name)
 
+response = attach_metrics(response, 'get_access_control_list')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
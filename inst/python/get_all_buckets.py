@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, get_all_buckets
+from s3helper import get_connection_response, get_all_buckets, attach_metrics
 
 parser = argparse.ArgumentParser(description='get all bucket names')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -14,5 +14,6 @@ args = parser.parse_args()
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
 response = get_all_buckets(conn_res)
 
+response = attach_metrics(response, 'get_all_buckets')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
 
@@ -1,13 +1,23 @@
+import sys
 import json
 import argparse
 
-from s3helper import get_connection_response, get_bucket_response, get_bucket_list_response, get_keys
+from s3helper import get_connection_response, get_bucket_response, get_filtered_bucket_list_response, get_keys, stream_keys, attach_metrics, write_metrics_summary
 
 parser = argparse.ArgumentParser(description='get keys')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
 parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
 parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
 parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--pattern', required=False, type=str, help='Regex that key names are searched for')
+parser.add_argument('--glob', required=False, type=str, help='Shell pattern that whole key names match, eg logs/2016-*.gz')
+parser.add_argument('--min_size', required=False, type=int, help='Minimum key size in bytes')
+parser.add_argument('--max_size', required=False, type=int, help='Maximum key size in bytes')
+parser.add_argument('--modified_since', required=False, type=str, help='Keys modified at or after this UTC date or timestamp, eg 2016-01-31T12:00:00')
+parser.add_argument('--modified_before', required=False, type=str, help='Keys modified before this UTC date or timestamp')
+parser.add_argument('--output', required=False, type=str, default='json', choices=['json', 'ndjson', 'columnar'], help='Output format - ndjson and columnar are written page by page')
+parser.add_argument('--list_workers', required=False, type=int, default=1, help='Number of concurrent listing requests over prefix shards')
+parser.add_argument('--shards', required=False, type=str, nargs='*', help='Key names that split the listing into shards')
 parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
 parser.add_argument('--region', required=False, type=str, help='Region info')
 
@@ -15,7 +25,12 @@ args = parser.parse_args()
 
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
 bucket_res = get_bucket_response(conn_res, args.bucket_name)
-bucket_list_res = get_bucket_list_response(bucket_res, args.prefix)
-response = get_keys(bucket_list_res)
+bucket_list_res, key_filter = get_filtered_bucket_list_response(bucket_res, args.prefix, args.pattern, args.glob, args.min_size, args.max_size, args.modified_since, args.modified_before)
 
-print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
+if args.output == 'json':
+    response = get_keys(bucket_list_res, args.list_workers, args.shards, key_filter)
+    response = attach_metrics(response, 'get_keys')
+    print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
+else:
+    stream_keys(bucket_list_res, sys.stdout, args.output, args.list_workers, args.shards, key_filter)
+    write_metrics_summary('get_keys')
@@ -0,0 +1,25 @@
+import json
+import argparse
+
+from s3helper import get_connection_response, get_bucket_response, get_bucket_list_response, get_prefix_usage, attach_metrics
+
+parser = argparse.ArgumentParser(description='aggregate number of keys and bytes by prefix')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--depth', required=False, type=int, default=1, help='Number of prefix levels below prefix to aggregate by')
+parser.add_argument('--delimiter', required=False, type=str, default='/', help='Delimiter of prefix levels')
+parser.add_argument('--list_workers', required=False, type=int, default=1, help='Number of concurrent listing requests over prefix shards')
+parser.add_argument('--shards', required=False, type=str, nargs='*', help='Key names that split the listing into shards')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+bucket_res = get_bucket_response(conn_res, args.bucket_name)
+response = get_prefix_usage(get_bucket_list_response(bucket_res, args.prefix), args.depth, args.delimiter, args.list_workers, args.shards)
+
+response = attach_metrics(response, 'get_prefix_usage')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
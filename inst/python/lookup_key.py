@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, get_bucket_response, lookup_key
+from s3helper import get_connection_response, get_bucket_response, lookup_key, attach_metrics
 
 parser = argparse.ArgumentParser(description='lookup a key')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -17,4 +17,5 @@ conn_res = get_connection_response(args.access_key_id, args.secret_access_key, a
 bucket_res = get_bucket_response(conn_res, args.bucket_name)
 response = lookup_key(bucket_res, args.key_name)
 
+response = attach_metrics(response, 'lookup_key')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
@@ -1,5 +1,7 @@
 import json
 
-from s3helper import lookup_location
+from s3tables import lookup_location
+
+response = lookup_location()
 
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
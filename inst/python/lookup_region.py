@@ -1,5 +1,7 @@
 import json
 
-from s3helper import lookup_region
+from s3tables import lookup_region
+
+response = lookup_region()
 
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
@@ -0,0 +1,20 @@
+import json
+import argparse
+
+from s3helper import query_key_index, attach_metrics
+
+parser = argparse.ArgumentParser(description='query keys in a local SQLite index')
+parser.add_argument('--index_path', required=True, type=str, help='SQLite index file path')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--pattern', required=False, type=str, help='Key search pattern')
+parser.add_argument('--min_size', required=False, type=int, help='Minimum key size in bytes')
+parser.add_argument('--max_size', required=False, type=int, help='Maximum key size in bytes')
+parser.add_argument('--modified_since', required=False, type=str, help='Earliest modified time, eg 2015-11-06 or 2015-11-06T00:00:00')
+
+args = parser.parse_args()
+
+response = query_key_index(args.index_path, args.bucket_name, args.prefix, args.pattern, args.min_size, args.max_size, args.modified_since)
+
+response = attach_metrics(response, 'query_key_index')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
@@ -0,0 +1,25 @@
+import sys
+import argparse
+
+from s3helper import get_connection_response, run_manifest, write_metrics_summary
+
+parser = argparse.ArgumentParser(description='run a manifest of operations')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--manifest', required=True, type=str, help='Manifest file - one JSON request per line, - for stdin')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent operations')
+parser.add_argument('--order', required=False, type=str, default='input', choices=['input', 'completion'], help='Order of results')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+
+if args.manifest == '-':
+    run_manifest(conn_res, sys.stdin, sys.stdout, args.max_workers, args.order == 'input')
+else:
+    with open(args.manifest) as manifest:
+        run_manifest(conn_res, manifest, sys.stdout, args.max_workers, args.order == 'input')
+
+write_metrics_summary('run_manifest')
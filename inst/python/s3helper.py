@@ -1,15 +1,79 @@
+import base64
+import binascii
+import calendar
+import copy
+import email.utils
+import fnmatch
+import hashlib
+import io
+import itertools
+import json
+import math
+import mimetypes
 import os
 import os.path
+import random
 import re
+import socket
 import ssl
+import sys
+import threading
+import time
+import zlib
 
 import boto
+from boto.compat import http_client
+from boto.vendored.six import unichr
+from boto.vendored.six.moves import queue
 from boto.s3.connection import OrdinaryCallingFormat, Location
 from boto.s3.key import Key
+from boto.s3.multipart import MultiPartUpload
+from boto.utils import RequestHook
 
-def get_connection_response(access_key_id, secret_access_key, is_ordinary_calling_format = False, region = None):
+import s3tables
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+## S3 limits of multipart uploads
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+## size of the chunks in which key contents are streamed
+STREAM_CHUNK_SIZE = 64 * 1024
+## content encodings by which uploads are compressed and downloads are decompressed, zstd needs the zstandard module
+CODECS = ['gzip', 'zstd']
+GZIP_LEVEL = 6
+## S3 limit of a multi-object delete request
+DELETE_BATCH_SIZE = 1000
+## S3 limit of a single copy request, larger objects are copied in parts
+MAX_COPY_SIZE = 5 * 1024 * 1024 * 1024
+DEFAULT_COPY_PART_SIZE = 128 * 1024 * 1024
+## S3 calls are retried with full jitter backoff of up to RETRY_MAX_DELAY seconds
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 20
+RETRYABLE_STATUSES = (500, 502, 503, 504)
+## BadDigest and IncompleteBody reject contents that are corrupted or cut short on the way, they are sent again
+RETRYABLE_ERROR_CODES = ('InternalError', 'RequestTimeout', 'RequestTimeTooSkewed', 'ServiceUnavailable', 'SlowDown', 'Throttling', 'BadDigest', 'IncompleteBody')
+THROTTLING_ERROR_CODES = ('ServiceUnavailable', 'SlowDown', 'Throttling')
+## concurrent S3 calls of a process, the limit is halved on throttling at most once per THROTTLING_COOLDOWN seconds
+MAX_CONCURRENT_REQUESTS = 256
+THROTTLING_COOLDOWN = 1.0
+## seconds for which bucket and key metadata are reused within a process, 0 disables caching
+METADATA_CACHE_TTL = 60
+
+## host, port and is_secure connect to an S3-compatible endpoint other than AWS, eg a local server
+def get_connection_response(access_key_id, secret_access_key, is_ordinary_calling_format = False, region = None, host = None, port = None, is_secure = True):
+    start = time.time()
     try:
-        if region is None:
+        if host is not None:
+            calling_format = OrdinaryCallingFormat() if is_ordinary_calling_format else boto.s3.connection.SubdomainCallingFormat()
+            conn = boto.connect_s3(access_key_id, secret_access_key, host=host, port=port, is_secure=is_secure, calling_format=calling_format)
+            response = (conn, None)
+        elif region is None:
             if is_ordinary_calling_format:
                 conn = boto.connect_s3(access_key_id, secret_access_key, calling_format=OrdinaryCallingFormat())
                 response = (conn, None)
@@ -24,15 +88,184 @@ def get_connection_response(access_key_id, secret_access_key, is_ordinary_callin
                calling_format = OrdinaryCallingFormat()
                )
             response = (conn, None)
+        ## retries are left to call_with_retry so that throttling reaches the request limiter
+        if conn is not None:
+            conn.num_retries = 0
+        set_metrics_hook(conn)
     except boto.exception.AWSConnectionError:
         response = (None, 'AWS connection error')
+    record_call('connect', time.time() - start)
     return response
 
-def get_bucket_response(conn_res, bucket_name):
+## contents that do not match their MD5 (S3DataError) are transferred again
+def is_retryable_error(e):
+    if isinstance(e, boto.exception.BotoServerError):
+        is_retryable = e.status in RETRYABLE_STATUSES or e.error_code in RETRYABLE_ERROR_CODES
+    elif isinstance(e, boto.exception.S3DataError):
+        is_retryable = True
+    else:
+        is_retryable = isinstance(e, (socket.error, http_client.HTTPException))
+    return is_retryable
+
+def is_throttling_error(e):
+    return isinstance(e, boto.exception.BotoServerError) and (e.status == 503 or e.error_code in THROTTLING_ERROR_CODES)
+
+def get_retry_delay(attempt):
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+## AIMD: the limit is halved from the number of calls in flight on throttling and raised by one after as many successes
+def new_request_limiter(max_limit = MAX_CONCURRENT_REQUESTS):
+    return {'limit': float(max_limit), 'max_limit': max_limit, 'active': 0, 'decreased': 0, 'cond': threading.Condition()}
+
+request_limiter = new_request_limiter()
+
+def acquire_request_slot(limiter):
+    with limiter['cond']:
+        while limiter['active'] >= int(limiter['limit']):
+            limiter['cond'].wait()
+        limiter['active'] += 1
+
+def release_request_slot(limiter, is_throttled = False):
+    with limiter['cond']:
+        if is_throttled:
+            if time.time() - limiter['decreased'] > THROTTLING_COOLDOWN:
+                limiter['limit'] = max(1.0, min(limiter['limit'], limiter['active']) / 2.0)
+                limiter['decreased'] = time.time()
+        else:
+            limiter['limit'] = min(float(limiter['max_limit']), limiter['limit'] + 1.0 / limiter['limit'])
+        limiter['active'] -= 1
+        limiter['cond'].notify_all()
+
+## opt-in metrics of a process, enabled by RS3HELPER_METRICS - see enable_metrics
+metrics = None
+metrics_lock = threading.Lock()
+
+def new_metrics(trace_path = None):
+    return {'started': time.time(), 'seconds': {}, 'calls': {}, 'requests': {}, 'bytes_sent': 0, 'bytes_received': 0, 'retries': 0, 'errors': 0, 'trace_path': trace_path}
+
+## every call of call_with_retry is appended to trace_path as a line of JSON
+def enable_metrics(trace_path = None):
+    global metrics
+    metrics = new_metrics(trace_path)
+
+def reset_metrics():
+    global metrics
+    if metrics is not None:
+        metrics = new_metrics(metrics['trace_path'])
+
+def write_trace(record):
+    if metrics['trace_path'] is not None:
+        with open(metrics['trace_path'], 'a') as f:
+            f.write(json.dumps(record, sort_keys=True, separators=(',', ':')) + '\n')
+
+def record_call(phase, seconds, attempts = 1, error = None):
+    if metrics is not None:
+        with metrics_lock:
+            metrics['seconds'][phase] = metrics['seconds'].get(phase, 0) + seconds
+            metrics['calls'][phase] = metrics['calls'].get(phase, 0) + 1
+            metrics['retries'] += attempts - 1
+            metrics['errors'] += 1 if error is not None else 0
+            write_trace({'event': 'call', 'time': time.time(), 'phase': phase, 'seconds': seconds, 'attempts': attempts, 'error': error})
+
+## HTTP requests by method and bytes of request and response bodies, as seen by boto connections
+class MetricsRequestHook(RequestHook):
+    def handle_request_data(self, request, response, error = False):
+        if metrics is not None:
+            with metrics_lock:
+                metrics['requests'][request.method] = metrics['requests'].get(request.method, 0) + 1
+                if request.method in ('PUT', 'POST'):
+                    metrics['bytes_sent'] += int(request.headers.get('Content-Length') or 0)
+                elif request.method == 'GET' and response is not None and not error:
+                    metrics['bytes_received'] += int(response.getheader('content-length') or 0)
+
+def set_metrics_hook(conn):
+    if metrics is not None and conn is not None:
+        conn.set_request_hook(MetricsRequestHook())
+    return conn
+
+def get_metrics_summary():
+    with metrics_lock:
+        summary = {
+            'elapsed': round(time.time() - metrics['started'], 6),
+            'seconds': dict((phase, round(seconds, 6)) for phase, seconds in metrics['seconds'].items()),
+            'calls': dict(metrics['calls']),
+            'requests': dict(metrics['requests']),
+            'bytes_sent': metrics['bytes_sent'],
+            'bytes_received': metrics['bytes_received'],
+            'retries': metrics['retries'],
+            'errors': metrics['errors']
+        }
+    return summary
+
+## the summary of a run is appended to the trace, None if metrics are disabled
+def write_metrics_summary(op = None):
+    summary = None
+    if metrics is not None:
+        summary = get_metrics_summary()
+        with metrics_lock:
+            write_trace(dict(summary, event='summary', op=op, time=time.time()))
+    return summary
+
+## the response of a script is returned as {'response': response, 'metrics': summary} if metrics are enabled
+## output that is streamed line by line keeps its format, its summary goes to the trace by write_metrics_summary
+def attach_metrics(response, op = None):
+    summary = write_metrics_summary(op)
+    if summary is not None:
+        response = {'response': response, 'metrics': summary}
+    return response
+
+## func must be a single S3 call that is safe to repeat, it must not call call_with_retry itself
+## phase is the one under which the call is counted in metrics, eg validate, list, download, upload, copy
+def call_with_retry(phase, func, *args, **kwargs):
+    attempt = 1
+    start = time.time()
+    while True:
+        acquire_request_slot(request_limiter)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            release_request_slot(request_limiter, is_throttling_error(e))
+            if attempt >= RETRY_MAX_ATTEMPTS or not is_retryable_error(e):
+                record_call(phase, time.time() - start, attempt, e.__class__.__name__)
+                raise
+            time.sleep(get_retry_delay(attempt))
+            attempt += 1
+        else:
+            release_request_slot(request_limiter)
+            record_call(phase, time.time() - start, attempt)
+            return result
+
+## existing buckets and key metadata by (host, bucket_name, key_name), key_name is None for a bucket
+metadata_cache = {}
+metadata_cache_lock = threading.Lock()
+
+def get_cached_metadata(host, bucket_name, key_name = None):
+    with metadata_cache_lock:
+        expires, value = metadata_cache.get((host, bucket_name, key_name), (0, None))
+    return value if expires > time.time() else None
+
+def set_cached_metadata(host, bucket_name, key_name, value):
+    if METADATA_CACHE_TTL > 0:
+        with metadata_cache_lock:
+            metadata_cache[(host, bucket_name, key_name)] = (time.time() + METADATA_CACHE_TTL, value)
+
+## a key name of None invalidates the bucket together with all of its keys
+def invalidate_cached_metadata(host, bucket_name, key_name = None):
+    with metadata_cache_lock:
+        for cache_key in list(metadata_cache):
+            if cache_key[:2] == (host, bucket_name) and (key_name is None or cache_key[2] == key_name):
+                del metadata_cache[cache_key]
+
+## validate = False returns a bucket handle without a request, errors surface in later requests
+def get_bucket_response(conn_res, bucket_name, validate = True):
     conn, res = conn_res
     if conn is not None:
         try:
-            bucket = conn.get_bucket(bucket_name)
+            if not validate or get_cached_metadata(conn.host, bucket_name) is not None:
+                bucket = conn.get_bucket(bucket_name, validate=False)
+            else:
+                bucket = call_with_retry('validate', conn.get_bucket, bucket_name)
+                set_cached_metadata(conn.host, bucket_name, None, True)
             if bucket is not None:
                 response = (bucket, None)
             else:
@@ -47,11 +280,21 @@ def get_bucket_response(conn_res, bucket_name):
         response = (None, res)
     return response
 
-def get_key_response(bucket_res, key_name):
+## a cached key is a copy of the key from a HEAD request, rebound to the caller's bucket
+def get_key_response(bucket_res, key_name, validate = True):
     bucket, res = bucket_res
     if bucket is not None:
         try:
-            key = bucket.get_key(key_name)
+            key = get_cached_metadata(bucket.connection.host, bucket.name, key_name)
+            if not validate:
+                key = bucket.new_key(key_name)
+            elif key is not None:
+                key = copy.copy(key)
+                key.bucket = bucket
+            else:
+                key = call_with_retry('validate', bucket.get_key, key_name)
+                if key is not None:
+                    set_cached_metadata(bucket.connection.host, bucket.name, key_name, copy.copy(key))
             if key is not None:
                 response = (key, None)
             else:
@@ -73,21 +316,284 @@ def get_bucket_list_response(bucket_res, prefix = None):
         response = (None, res)
     return response
 
+## pages through a listing once - each page is a list of keys from a single LIST request
+def get_bucket_list_pages(bucket_list_res, marker = None):
+    bucket_list, res = bucket_list_res
+    if bucket_list is not None:
+        marker = marker if marker is not None else bucket_list.marker
+        is_truncated = True
+        while is_truncated:
+            rs = call_with_retry('list', bucket_list.bucket.get_all_keys, headers=bucket_list.headers, prefix=bucket_list.prefix, marker=marker, delimiter=bucket_list.delimiter)
+            page = [key for key in rs]
+            if len(page) > 0:
+                marker = rs.next_marker or page[-1].name
+            is_truncated = rs.is_truncated and len(page) > 0
+            yield page
+
 def count_bucket_list(bucket_list_res):
     bucket_list, res = bucket_list_res
     if bucket_list is not None:
         cnt = 0
-        for key in bucket_list:
-            cnt += 1
+        for page in get_bucket_list_pages(bucket_list_res):
+            cnt += len(page)
     else:
         cnt = -1
     return cnt
 
+def clone_connection(conn):
+    clone = conn.__class__(
+        aws_access_key_id = conn.aws_access_key_id,
+        aws_secret_access_key = conn.aws_secret_access_key,
+        is_secure = conn.is_secure,
+        port = conn.port,
+        host = conn.host,
+        calling_format = conn.calling_format,
+        security_token = conn.provider.security_token
+        )
+    clone.num_retries = conn.num_retries
+    return set_metrics_hook(clone)
+
+def map_in_threads(func, items, max_workers = 1, ordered = True, max_pending = 1000):
+    if max_workers is None or max_workers <= 1:
+        for item in items:
+            yield func(item)
+    else:
+        pending = threading.Semaphore(max_pending)
+        stopped = threading.Event()
+        failure = []
+        ## an error raised by items (eg a failed LIST request) is re-raised in the calling thread
+        def feed():
+            try:
+                for item in items:
+                    pending.acquire()
+                    if stopped.is_set():
+                        return
+                    yield item
+            except Exception as e:
+                failure.append(e)
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max_workers)
+        try:
+            results = pool.imap(func, feed()) if ordered else pool.imap_unordered(func, feed())
+            for result in results:
+                pending.release()
+                yield result
+        finally:
+            ## feed may be blocked on pending in the pool's task handler, which terminate() joins
+            stopped.set()
+            pending.release()
+            pool.terminate()
+        if len(failure) > 0:
+            raise failure[0]
+
+## boto connections are not thread safe - each worker thread gets its own connection and
+## an unvalidated handle of a bucket that has already been validated by the caller
+def map_in_workers(bucket_res, func, items, max_workers = 1, max_pending = 1000):
+    bucket, res = bucket_res
+    if max_workers is None or max_workers <= 1 or bucket is None:
+        for item in items:
+            yield func(bucket_res, item)
+    else:
+        local = threading.local()
+        def run(item):
+            if not hasattr(local, 'bucket_res'):
+                local.bucket_res = (clone_connection(bucket.connection).get_bucket(bucket.name, validate=False), None)
+            return func(local.bucket_res, item)
+        for result in map_in_threads(run, items, max_workers, True, max_pending):
+            yield result
+
+## shards of a listing: (prefix, marker, end) covers keys after marker up to and including end
+## boundaries split the listing at the given key names, otherwise the common prefixes under the prefix
+## are discovered with a delimiter and keys directly under the prefix are passed through in order
+## boundaries up to the marker of the listing are dropped as their shards are already listed
+def get_list_shards(bucket_list, boundaries = None, delimiter = '/'):
+    prefix = bucket_list.prefix or ''
+    if boundaries:
+        start = bucket_list.marker or None
+        boundaries = sorted(set(boundary for boundary in boundaries if start is None or boundary > start))
+        for marker, end in zip([start] + boundaries, boundaries + [None]):
+            yield ('shard', (prefix, marker, end))
+    else:
+        discovery = bucket_list.bucket.list(prefix, delimiter, bucket_list.marker, bucket_list.headers)
+        for page in get_bucket_list_pages((discovery, None)):
+            keys = []
+            for item in sorted(page, key=lambda item: item.name):
+                if isinstance(item, Key):
+                    keys.append(item)
+                    continue
+                if len(keys) > 0:
+                    yield ('keys', keys)
+                    keys = []
+                yield ('shard', (item.name, None, None))
+            if len(keys) > 0:
+                yield ('keys', keys)
+
+## shards are listed concurrently by up to list_workers threads, each up to max_buffered_pages ahead of
+## the consumer - shards are disjoint and ordered so that reading them in turn merges them in key order
+def get_sharded_list_pages(bucket_list_res, list_workers = 1, boundaries = None, max_buffered_pages = 4):
+    bucket_list, res = bucket_list_res
+    if bucket_list is None:
+        return
+    bucket = bucket_list.bucket
+    local = threading.local()
+    stopped = threading.Event()
+    def put(pages, item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+    def list_shard(shard, pages):
+        shard_prefix, marker, end = shard
+        try:
+            if not hasattr(local, 'bucket'):
+                local.bucket = clone_connection(bucket.connection).get_bucket(bucket.name, validate=False)
+            shard_list = local.bucket.list(shard_prefix, '', marker or '', bucket_list.headers)
+            for page in get_bucket_list_pages((shard_list, None)):
+                is_last = end is not None and len(page) > 0 and page[-1].name >= end
+                page = [key for key in page if end is None or key.name <= end]
+                if not put(pages, page) or is_last:
+                    break
+            put(pages, None)
+        except Exception as e:
+            put(pages, e)
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(list_workers or 1, 1))
+    ahead = []
+    shards = get_list_shards(bucket_list, boundaries)
+    try:
+        is_listed = False
+        while not is_listed or len(ahead) > 0:
+            while not is_listed and sum(1 for kind, _ in ahead if kind == 'shard') < max(list_workers or 1, 1) * 2:
+                item = next(shards, None)
+                if item is None:
+                    is_listed = True
+                elif item[0] == 'shard':
+                    pages = queue.Queue(max_buffered_pages)
+                    pool.apply_async(list_shard, (item[1], pages))
+                    ahead.append(('shard', pages))
+                else:
+                    ahead.append(item)
+            if len(ahead) == 0:
+                break
+            kind, value = ahead.pop(0)
+            if kind == 'keys':
+                yield value
+                continue
+            while True:
+                page = value.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+    finally:
+        stopped.set()
+        pool.terminate()
+
+## a sharded listing if list_workers > 1 or boundaries are given, otherwise a single listing pass
+## with key_filter, pages keep only the keys that match it
+def get_list_pages(bucket_list_res, list_workers = 1, boundaries = None, key_filter = None):
+    if (list_workers is not None and list_workers > 1) or boundaries:
+        pages = get_sharded_list_pages(bucket_list_res, list_workers, boundaries)
+    else:
+        pages = get_bucket_list_pages(bucket_list_res)
+    if key_filter is not None:
+        pages = ([key for key in page if is_key_matched(key_filter, key)] for page in pages)
+    return pages
+
+## a regex is anchored to the start of key names only with a leading ^, its literal prefix ends before the first
+## special character or a literal that may not occur - patterns with alternatives have none
+def get_regex_prefix(pattern):
+    literal = []
+    if pattern.startswith('^') and '|' not in pattern:
+        i = 1
+        while i < len(pattern):
+            if pattern[i] == '\\' and pattern[i + 1:i + 2] != '' and not pattern[i + 1].isalnum():
+                char, size = pattern[i + 1], 2
+            elif pattern[i] not in '\\.^$*+?{}[]()':
+                char, size = pattern[i], 1
+            else:
+                break
+            if pattern[i + size:i + size + 1] in ('*', '?', '{'):
+                break
+            literal.append(char)
+            i += size
+            if pattern[i:i + 1] == '+':
+                break
+    return ''.join(literal)
+
+def get_glob_prefix(glob):
+    return re.split(r'[*?[]', glob, 1)[0]
+
+## last_modified of listings is an ISO 8601 timestamp in UTC, eg 2015-11-06T01:02:03.000Z, that a date or
+## a timestamp without its fraction and zone compares with as a string
+MODIFIED_TIME_REGEX = re.compile(r'^\d{4}-\d{2}-\d{2}(T\d{2}(:\d{2}(:\d{2})?)?)?Z?$')
+
+## key filter of listing-driven operations, compiled once and applied to keys as a listing streams:
+## pattern is a regex searched in key names, glob a shell pattern matched against whole key names,
+## min_size and max_size bound sizes in bytes and modified_since (inclusive) and modified_before bound
+## the modified time by a date or timestamp in UTC, eg 2016-01-31 or 2016-01-31T12:00:00
+## prefix of the filter is literal text that key names that match pattern and glob start with
+def compile_key_filter(pattern = None, glob = None, min_size = None, max_size = None, modified_since = None, modified_before = None):
+    try:
+        regex = re.compile(pattern) if pattern is not None else None
+    except re.error as e:
+        return (None, 'invalid pattern: {0}'.format(str(e)))
+    for name, modified in [('modified_since', modified_since), ('modified_before', modified_before)]:
+        if modified is not None and MODIFIED_TIME_REGEX.match(modified) is None:
+            return (None, 'invalid {0}: {1} is not a date or timestamp such as 2016-01-31T12:00:00'.format(name, modified))
+    prefixes = sorted([get_regex_prefix(pattern) if pattern is not None else '', get_glob_prefix(glob) if glob is not None else ''], key=len)
+    key_filter = {
+        'prefix': prefixes[1] if prefixes[1].startswith(prefixes[0]) else prefixes[0],
+        'regex': regex,
+        'glob': re.compile(fnmatch.translate(glob)) if glob is not None else None,
+        'min_size': min_size,
+        'max_size': max_size,
+        'modified_since': modified_since.rstrip('Z') if modified_since is not None else None,
+        'modified_before': modified_before.rstrip('Z') if modified_before is not None else None,
+        'args': {'pattern': pattern, 'glob': glob, 'min_size': min_size, 'max_size': max_size, 'modified_since': modified_since, 'modified_before': modified_before}
+    }
+    return (key_filter, None)
+
+## cheap comparisons come first, names are matched last
+def is_key_matched(key_filter, key):
+    return (
+        (key_filter['min_size'] is None or key.size >= key_filter['min_size']) and
+        (key_filter['max_size'] is None or key.size <= key_filter['max_size']) and
+        (key_filter['modified_since'] is None or key.last_modified >= key_filter['modified_since']) and
+        (key_filter['modified_before'] is None or key.last_modified < key_filter['modified_before']) and
+        (key_filter['glob'] is None or key_filter['glob'].match(key.name) is not None) and
+        (key_filter['regex'] is None or key_filter['regex'].search(key.name) is not None)
+        )
+
+## the listing is narrowed to the literal prefix of a filter that lies under prefix
+def get_filter_prefix(prefix, key_filter):
+    literal = key_filter['prefix'] if key_filter is not None else ''
+    return literal if len(literal) > len(prefix or '') and literal.startswith(prefix or '') else prefix
+
+## (bucket_list_res, key_filter) of the keys under prefix that match the filter - a filter that does not compile
+## is the message of the listing response
+def get_filtered_bucket_list_response(bucket_res, prefix = None, pattern = None, glob = None, min_size = None, max_size = None, modified_since = None, modified_before = None):
+    key_filter, res = compile_key_filter(pattern, glob, min_size, max_size, modified_since, modified_before)
+    if key_filter is None:
+        return ((None, res), None)
+    return (get_bucket_list_response(bucket_res, get_filter_prefix(prefix, key_filter)), key_filter)
+
+## a listing resumes after the marker of a journal - shard discovery lists common prefixes, which may
+## hold keys after the marker, so it starts from the beginning and finished keys are skipped instead
+def resume_bucket_list(bucket_list, journal, list_workers = 1, boundaries = None):
+    if journal is not None and journal['marker'] is not None and (boundaries or list_workers is None or list_workers <= 1):
+        bucket_list.marker = journal['marker']
+
+## precomputed in s3tables, which the lookup scripts import without boto
 def lookup_location():
-    return [loc for loc in dir(Location) if loc[0].isupper()]
+    return s3tables.lookup_location()
 
 def lookup_region():
-    return [rgn.name for rgn in boto.s3.regions()]
+    return s3tables.lookup_region()
 
 def lookup_bucket(conn_res, bucket_name):
     bucket, res = get_bucket_response(conn_res, bucket_name)
@@ -108,7 +614,7 @@ def lookup_key(bucket_res, key_name):
 def get_all_buckets(conn_res):
     conn, res = conn_res
     if conn is not None:
-        buckets = conn.get_all_buckets()
+        buckets = call_with_retry('list', conn.get_all_buckets)
         if buckets is not None:
             response = [{'bucket_name': bucket.name, 'created': bucket.creation_date, 'message': None} for bucket in buckets]
         else:
@@ -117,17 +623,175 @@ def get_all_buckets(conn_res):
         response = [{'bucket_name': None, 'created': None, 'message': res} for bucket in buckets]
     return response
 
-def get_keys(bucket_list_res):
+def get_key_info(key):
+    return {'key_name': key.name, 'key_size': key.size, 'modified': key.last_modified, 'message': None}
+
+def get_keys(bucket_list_res, list_workers = 1, shards = None, key_filter = None):
     bucket_list, res = bucket_list_res
-    cnt = count_bucket_list(bucket_list_res)
-    if cnt > 0:
-        response = [{'key_name': key.name, 'key_size': key.size, 'modified': key.last_modified, 'message': None} for key in bucket_list]
-    elif cnt == 0:
-        response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'key is not found'}]
+    if bucket_list is not None:
+        response = [get_key_info(key) for page in get_list_pages(bucket_list_res, list_workers, shards, key_filter) for key in page]
+        if len(response) == 0:
+            response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'key is not found'}]
     else:
         response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': res}]
     return response
 
+def get_filtered_keys(bucket_res, prefix = None, list_workers = 1, shards = None, pattern = None, glob = None, min_size = None, max_size = None, modified_since = None, modified_before = None):
+    bucket_list_res, key_filter = get_filtered_bucket_list_response(bucket_res, prefix, pattern, glob, min_size, max_size, modified_since, modified_before)
+    return get_keys(bucket_list_res, list_workers, shards, key_filter)
+
+def write_key_rows(outstream, rows, output = 'ndjson'):
+    if output == 'columnar':
+        columns = dict((name, [row[name] for row in rows]) for name in ('key_name', 'key_size', 'modified', 'message'))
+        outstream.write(json.dumps(columns, sort_keys=True, separators=(',', ':')) + '\n')
+    else:
+        for row in rows:
+            outstream.write(json.dumps(row, sort_keys=True, separators=(',', ':')) + '\n')
+    outstream.flush()
+
+## writes the same rows as get_keys page by page - ndjson: one key per line, columnar: one page of columns per line
+def stream_keys(bucket_list_res, outstream, output = 'ndjson', list_workers = 1, shards = None, key_filter = None):
+    bucket_list, res = bucket_list_res
+    cnt = 0
+    if bucket_list is not None:
+        for page in get_list_pages(bucket_list_res, list_workers, shards, key_filter):
+            if len(page) > 0:
+                write_key_rows(outstream, [get_key_info(key) for key in page], output)
+                cnt += len(page)
+        if cnt == 0:
+            write_key_rows(outstream, [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'key is not found'}], output)
+    else:
+        write_key_rows(outstream, [{'key_name': None, 'key_size': None, 'modified': None, 'message': res}], output)
+    return cnt
+
+## "du" of a listing: number of keys, bytes and oldest and newest modified time of the listed prefix (depth 0)
+## and of each prefix below it down to depth levels of delimiter - keys are streamed, only the groups are kept
+def get_prefix_usage(bucket_list_res, depth = 1, delimiter = '/', list_workers = 1, shards = None):
+    bucket_list, res = bucket_list_res
+    if bucket_list is not None:
+        prefix = bucket_list.prefix or ''
+        groups = {}
+        def add(group_prefix, level, key):
+            group = groups.get(group_prefix)
+            if group is None:
+                groups[group_prefix] = {'prefix': group_prefix, 'depth': level, 'num_keys': 1, 'total_size': key.size, 'oldest': key.last_modified, 'newest': key.last_modified, 'message': None}
+            else:
+                group['num_keys'] += 1
+                group['total_size'] += key.size
+                group['oldest'] = min(group['oldest'], key.last_modified)
+                group['newest'] = max(group['newest'], key.last_modified)
+        try:
+            for page in get_list_pages(bucket_list_res, list_workers, shards):
+                for key in page:
+                    add(prefix, 0, key)
+                    parts = key.name[len(prefix):].split(delimiter)
+                    for level in range(1, min(depth, len(parts) - 1) + 1):
+                        add(prefix + delimiter.join(parts[:level]) + delimiter, level, key)
+            response = [groups[group_prefix] for group_prefix in sorted(groups)]
+            if len(response) == 0:
+                response = [{'prefix': prefix, 'depth': 0, 'num_keys': 0, 'total_size': 0, 'oldest': None, 'newest': None, 'message': 'key is not found'}]
+        except boto.exception.S3ResponseError as re:
+            response = [{'prefix': prefix, 'depth': None, 'num_keys': None, 'total_size': None, 'oldest': None, 'newest': None, 'message': 'S3ResponseError = {0} {1} when listing keys'.format(re[0], re[1])}]
+    else:
+        response = [{'prefix': None, 'depth': None, 'num_keys': None, 'total_size': None, 'oldest': None, 'newest': None, 'message': res}]
+    return response
+
+## sqlite3 is imported by the index operations only
+def open_key_index(index_path):
+    import sqlite3
+    index = sqlite3.connect(index_path)
+    index.execute('CREATE TABLE IF NOT EXISTS keys (bucket_name TEXT NOT NULL, key_name TEXT NOT NULL, key_size INTEGER, modified TEXT, etag TEXT, PRIMARY KEY (bucket_name, key_name))')
+    index.execute('CREATE INDEX IF NOT EXISTS keys_modified ON keys (bucket_name, modified)')
+    index.commit()
+    return index
+
+## the least name that is greater than every name under prefix, None if there is none - names are compared
+## by code point (sqlite BINARY collation of UTF-8), surrogates are skipped as they cannot be encoded
+def get_prefix_bound(prefix):
+    while len(prefix) > 0:
+        code = ord(prefix[-1])
+        if code < sys.maxunicode:
+            return prefix[:-1] + unichr(0xE000 if code == 0xD7FF else code + 1)
+        prefix = prefix[:-1]
+    return None
+
+## a range over key_name rather than a function of it so that the primary key index is used
+def get_prefix_clause(prefix):
+    prefix = prefix.decode('utf-8') if isinstance(prefix, bytes) else (prefix or u'')
+    bound = get_prefix_bound(prefix)
+    if bound is None:
+        return ('key_name >= ?', [prefix])
+    return ('key_name >= ? AND key_name < ?', [prefix, bound])
+
+## full: replaces the indexed keys under the prefix, incremental: lists only after the last indexed key (append-only layouts)
+def index_keys(bucket_list_res, index_path, incremental = False):
+    import sqlite3
+    bucket_list, res = bucket_list_res
+    prefix = bucket_list.prefix if bucket_list is not None else None
+    if bucket_list is not None:
+        bucket_name = bucket_list.bucket.name
+        index = open_key_index(index_path)
+        try:
+            key_clause, key_args = get_prefix_clause(prefix)
+            prefix_clause = 'bucket_name = ? AND ' + key_clause
+            prefix_args = [bucket_name] + key_args
+            marker = None
+            if incremental:
+                marker = index.execute('SELECT max(key_name) FROM keys WHERE ' + prefix_clause, prefix_args).fetchone()[0]
+            else:
+                index.execute('DELETE FROM keys WHERE ' + prefix_clause, prefix_args)
+            cnt = 0
+            for page in get_bucket_list_pages(bucket_list_res, marker or ''):
+                index.executemany('INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?, ?)', [(bucket_name, key.name, key.size, key.last_modified, key.etag) for key in page if isinstance(key, Key)])
+                index.commit()
+                cnt += len(page)
+            response = {'bucket_name': bucket_name, 'prefix': prefix, 'is_indexed': True, 'num_keys': cnt, 'message': None}
+        except boto.exception.S3ResponseError as re:
+            index.commit()
+            response = {'bucket_name': bucket_name, 'prefix': prefix, 'is_indexed': False, 'num_keys': None, 'message': 'S3ResponseError = {0} {1} when listing keys'.format(re[0], re[1])}
+        except sqlite3.Error as se:
+            response = {'bucket_name': bucket_name, 'prefix': prefix, 'is_indexed': False, 'num_keys': None, 'message': 'sqlite3 error = {0}'.format(se)}
+        finally:
+            index.close()
+    else:
+        response = {'bucket_name': None, 'prefix': prefix, 'is_indexed': False, 'num_keys': None, 'message': res}
+    return response
+
+def query_key_index(index_path, bucket_name, prefix = None, pattern = None, min_size = None, max_size = None, modified_since = None):
+    import sqlite3
+    if os.path.isfile(index_path):
+        clauses, args = ['bucket_name = ?'], [bucket_name]
+        if prefix is not None:
+            key_clause, key_args = get_prefix_clause(prefix)
+            clauses.append(key_clause)
+            args.extend(key_args)
+        if min_size is not None:
+            clauses.append('key_size >= ?')
+            args.append(min_size)
+        if max_size is not None:
+            clauses.append('key_size <= ?')
+            args.append(max_size)
+        if modified_since is not None:
+            clauses.append('modified >= ?')
+            args.append(modified_since)
+        try:
+            regex = re.compile(pattern) if pattern is not None else None
+            index = open_key_index(index_path)
+            try:
+                rows = index.execute('SELECT key_name, key_size, modified FROM keys WHERE ' + ' AND '.join(clauses) + ' ORDER BY key_name', args)
+                response = [{'key_name': row[0], 'key_size': row[1], 'modified': row[2], 'message': None} for row in rows if regex is None or regex.search(row[0]) is not None]
+            finally:
+                index.close()
+            if len(response) == 0:
+                response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'key is not found'}]
+        except re.error as e:
+            response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'invalid pattern: {0}'.format(str(e))}]
+        except sqlite3.Error as se:
+            response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'sqlite3 error = {0}'.format(se)}]
+    else:
+        response = [{'key_name': None, 'key_size': None, 'modified': None, 'message': 'index is not found'}]
+    return response
+
 def get_access_control_list(conn_res, bucket_name, key_name = None):
     bucket, res = get_bucket_response(conn_res, bucket_name)
     if key_name is not None:
@@ -136,7 +800,7 @@ def get_access_control_list(conn_res, bucket_name, key_name = None):
         target, target_res = bucket, res
     if target is not None:
         try:
-            acp = target.get_acl()
+            acp = call_with_retry('acl', target.get_acl)
             message = None
         except boto.exception.S3ResponseError as re:
             acp = None
@@ -164,7 +828,7 @@ def set_access_control_list(conn_res, bucket_name, permission, key_name = None):
         target, target_res = bucket, res
     if target is not None:
         try:
-            target.set_acl(permission)
+            call_with_retry('acl', target.set_acl, permission)
             response = {'permission': permission, 'is_set': True, 'message': None}
         except boto.exception.S3ResponseError as re:
             response = {'permission': permission, 'is_set': False, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
@@ -174,13 +838,113 @@ def set_access_control_list(conn_res, bucket_name, permission, key_name = None):
         response = {'permission': permission, 'is_set': False, 'message': target_res}
     return response
 
+## func(bucket, key_name) is applied to each listed key that matches key_filter, up to max_workers at a time,
+## and (key_name, result, message) is yielded for each key - message is None unless the request failed
+def map_listed_keys(bucket_list_res, func, key_filter, max_workers = 1, list_workers = 1, shards = None):
+    bucket_list, res = bucket_list_res
+    def matched_keys():
+        for page in get_list_pages(bucket_list_res, list_workers, shards, key_filter):
+            for key in page:
+                yield key
+    def apply(bucket_res, key):
+        try:
+            response = (key.name, call_with_retry('acl', func, bucket_res[0], key.name), None)
+        except boto.exception.S3ResponseError as sre:
+            response = (key.name, None, 'S3ResponseError = {0} {1}'.format(sre[0], sre[1]))
+        except:
+            response = (key.name, None, 'Unhandled error occurred when requesting acp')
+        return response
+    return map_in_workers((bucket_list.bucket, None), apply, matched_keys(), max_workers)
+
+## results of map_listed_keys are passed to collect, errors are returned as [{'key_name', 'message'}]
+## where key_name is None if the listing failed
+def collect_listed_keys(bucket_res, func, collect, prefix = None, pattern = None, max_workers = 1, list_workers = 1, shards = None):
+    (bucket_list, res), key_filter = get_filtered_bucket_list_response(bucket_res, prefix, pattern)
+    errors = []
+    if bucket_list is not None:
+        try:
+            for key_name, result, message in map_listed_keys((bucket_list, res), func, key_filter, max_workers, list_workers, shards):
+                if message is None:
+                    collect(key_name, result)
+                else:
+                    errors.append({'key_name': key_name, 'message': message})
+            res = None
+        except boto.exception.S3ResponseError as sre:
+            res = 'S3ResponseError = {0} {1} when listing keys'.format(sre[0], sre[1])
+        except:
+            res = 'Unhandled error occurred when listing keys'
+    return (errors, res)
+
+## canned access control policy is set to every key under prefix that matches pattern, each in a single request
+def set_access_control_lists(conn_res, bucket_name, permission, prefix = None, pattern = None, max_workers = 1, list_workers = 1, shards = None):
+    bucket_res = get_bucket_response(conn_res, bucket_name)
+    summary = {'num_set': 0}
+    def set_acl(bucket, key_name):
+        return bucket.set_acl(permission, key_name)
+    def collect(key_name, result):
+        summary['num_set'] += 1
+    errors, res = collect_listed_keys(bucket_res, set_acl, collect, prefix, pattern, max_workers, list_workers, shards)
+    num_keys = summary['num_set'] + len(errors)
+    if res is not None:
+        message = res
+    elif num_keys == 0:
+        message = 'key is not found'
+    elif len(errors) > 0:
+        message = '{0} of {1} keys are not set - {2}'.format(len(errors), num_keys, errors[0]['message'])
+    else:
+        message = None
+    return {'bucket_name': bucket_name, 'prefix': prefix, 'permission': permission, 'is_set': message is None, 'num_keys': num_keys, 'num_set': summary['num_set'], 'errors': errors, 'message': message}
+
+## a grant as grantee:permission, a group by the last part of its URI, eg AllUsers:READ
+def get_grant_name(grant):
+    if grant.type == 'Group':
+        grantee = (grant.uri or '').rsplit('/', 1)[-1]
+    else:
+        grantee = grant.display_name or grant.email_address or grant.id
+    return '{0}:{1}'.format(grantee, grant.permission)
+
+## keys are counted as public if all users are granted, authenticated if authenticated users are granted,
+## shared if others than the owner are granted and private otherwise - exceptions are the keys that are not private
+def audit_access_control_lists(conn_res, bucket_name, prefix = None, pattern = None, max_workers = 1, list_workers = 1, shards = None):
+    bucket_res = get_bucket_response(conn_res, bucket_name)
+    summary = {'num_private': 0, 'num_public': 0, 'num_authenticated': 0, 'num_shared': 0}
+    exceptions = []
+    def get_acl(bucket, key_name):
+        return bucket.get_acl(key_name)
+    def collect(key_name, acp):
+        owner_id = acp.owner.id if acp.owner is not None else None
+        grants = [grant for grant in acp.acl.grants if grant.type == 'Group' or grant.id != owner_id]
+        groups = [(grant.uri or '').rsplit('/', 1)[-1] for grant in grants if grant.type == 'Group']
+        if 'AllUsers' in groups:
+            summary['num_public'] += 1
+        elif 'AuthenticatedUsers' in groups:
+            summary['num_authenticated'] += 1
+        elif len(grants) > 0:
+            summary['num_shared'] += 1
+        else:
+            summary['num_private'] += 1
+        if len(grants) > 0:
+            exceptions.append({'key_name': key_name, 'grants': [get_grant_name(grant) for grant in grants]})
+    errors, res = collect_listed_keys(bucket_res, get_acl, collect, prefix, pattern, max_workers, list_workers, shards)
+    num_keys = sum(summary.values()) + len(errors)
+    if res is not None:
+        message = res
+    elif num_keys == 0:
+        message = 'key is not found'
+    elif len(errors) > 0:
+        message = '{0} of {1} keys are not audited - {2}'.format(len(errors), num_keys, errors[0]['message'])
+    else:
+        message = None
+    return dict(summary, bucket_name=bucket_name, prefix=prefix, is_audited=message is None, num_keys=num_keys, exceptions=exceptions, errors=errors, message=message)
+
 def create_bucket(conn_res, bucket_name, location = None):
     conn, res = conn_res
     loc = location if location in dir(Location) else None
     if conn is not None:
         if not lookup_bucket(conn_res, bucket_name)['is_exists']:
             try:
-                bucket = conn.create_bucket(bucket_name, location = loc) if loc else conn.create_bucket(bucket_name)
+                bucket = call_with_retry('create', conn.create_bucket, bucket_name, location = loc) if loc else call_with_retry('create', conn.create_bucket, bucket_name)
+                set_cached_metadata(conn.host, bucket_name, None, True)
                 response = {'bucket_name': bucket_name, 'is_created': True, 'location': loc, 'message': None}
             except boto.exception.S3CreateError as ce:
                 response = {'bucket_name': bucket_name, 'is_created': False, 'location': loc, 'message': 'S3CreateError = {0} {1} {2}'.format(ce[0], ce[1], ce[2])}
@@ -190,24 +954,65 @@ def create_bucket(conn_res, bucket_name, location = None):
         response = {'bucket_name': bucket_name, 'is_created': False, 'location': loc, 'message': res}
     return response
 
-def delete_bucket(conn_res, bucket_name):
+def get_key_name_batches(bucket_list_res, batch_size = DELETE_BATCH_SIZE, list_workers = 1, shards = None, key_filter = None):
+    batch = []
+    for page in get_list_pages(bucket_list_res, list_workers, shards, key_filter):
+        for key in page:
+            batch.append(key.name)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if len(batch) > 0:
+        yield batch
+
+def delete_key_batch(bucket_res, key_names):
+    bucket, res = bucket_res
+    for key_name in key_names:
+        invalidate_cached_metadata(bucket.connection.host, bucket.name, key_name)
+    try:
+        result = call_with_retry('delete', bucket.delete_keys, key_names, quiet=True)
+        errors = [{'key': error.key, 'message': '{0} {1}'.format(error.code, error.message)} for error in result.errors]
+        num_deleted = len(key_names) - len(errors)
+    except boto.exception.S3ResponseError as re:
+        errors = [{'key': None, 'message': 'S3ResponseError = {0} {1} when deleting {2} keys'.format(re[0], re[1], len(key_names))}]
+        num_deleted = 0
+    except:
+        errors = [{'key': None, 'message': 'Unhandled error occurred when deleting {0} keys'.format(len(key_names))}]
+        num_deleted = 0
+    return (len(key_names), num_deleted, errors)
+
+## multi-object delete of up to 1000 keys per request, batches are streamed from a single listing pass
+## with a journal, the listing marker advances over batches that are deleted in full
+def delete_listed_keys(bucket_list_res, max_workers = 1, list_workers = 1, shards = None, journal = None, key_filter = None):
+    bucket_list, res = bucket_list_res
+    num_listed, num_deleted, errors = 0, 0, []
+    try:
+        resume_bucket_list(bucket_list, journal, list_workers, shards)
+        key_name_batches = ([key_name for key_name in batch if not is_journaled(journal, key_name, get_key_order)] for batch in get_key_name_batches(bucket_list_res, DELETE_BATCH_SIZE, list_workers, shards, key_filter))
+        delete_batch = lambda bucket_res, key_names: (key_names[-1], delete_key_batch(bucket_res, key_names))
+        batches = map_in_workers((bucket_list.bucket, None), delete_batch, (batch for batch in key_name_batches if len(batch) > 0), max_workers)
+        for batch_num, (last_key_name, (batch_listed, batch_deleted, batch_errors)) in enumerate(batches, 1):
+            num_listed += batch_listed
+            num_deleted += batch_deleted
+            errors.extend([dict(error, batch=batch_num) for error in batch_errors])
+            record_journal(journal, last_key_name, len(batch_errors) == 0)
+    except boto.exception.S3ResponseError as re:
+        errors.append({'batch': None, 'key': None, 'message': 'S3ResponseError = {0} {1} when listing keys'.format(re[0], re[1])})
+    except:
+        errors.append({'batch': None, 'key': None, 'message': 'Unhandled error occurred when listing keys'})
+    return (num_listed, num_deleted, errors)
+
+def delete_bucket(conn_res, bucket_name, max_workers = 1):
     bucket, res = get_bucket_response(conn_res, bucket_name)
     if bucket is not None:
         bucket_list, res = get_bucket_list_response((bucket, res))
-        cnt = count_bucket_list((bucket_list, res))
-        key_msg = None
-        if cnt > 0:
-            try:
-                for key in bucket_list:
-                    key.delete()
-            except boto.exception.S3ResponseError as re:
-                key_msg = 'S3ResponseError = {0} {1}'.format(re[0], re[1])
-            except:
-                key_msg = 'Unhandled error occurred when deleting keys'
+        num_listed, num_deleted, errors = delete_listed_keys((bucket_list, res), max_workers)
+        key_msg = '{0} of {1} keys are not deleted - {2}'.format(num_listed - num_deleted, num_listed, errors[0]['message']) if len(errors) > 0 else None
         conn, _ = conn_res
         bucket_msg = None
+        invalidate_cached_metadata(conn.host, bucket_name)
         try:
-            conn.delete_bucket(bucket_name)
+            call_with_retry('delete', conn.delete_bucket, bucket_name)
             response = {'bucket_name': bucket_name, 'is_deleted': True, 'message': None}
         except boto.exception.S3ResponseError as re:
             bucket_msg = 'S3ResponseError = {0} {1}'.format(re[0], re[1])
@@ -219,39 +1024,40 @@ def delete_bucket(conn_res, bucket_name):
         response = {'bucket_name': bucket_name, 'is_deleted': False, 'message': res}
     return response
 
-def delete_keys(conn_res, bucket_name, key_name = None, prefix = None):
+## journal_path: journal of a prefix deletion, a rerun of an interrupted deletion lists keys after the last finished batch
+## without key_name, the keys under prefix that match the filter of compile_key_filter are deleted
+def delete_keys(conn_res, bucket_name, key_name = None, prefix = None, max_workers = 1, list_workers = 1, shards = None, journal_path = None, pattern = None, glob = None, min_size = None, max_size = None, modified_since = None, modified_before = None):
     bucket, res = get_bucket_response(conn_res, bucket_name)
     if bucket is not None:
         if key_name is not None:
             key, res = get_key_response((bucket, res), key_name)
             if key is not None:
+                invalidate_cached_metadata(bucket.connection.host, bucket.name, key_name)
                 try:
-                    bucket.delete_key(key_name)
-                    response = {'key': key_name, 'is_deleted': True, 'num_keys': 1, 'message': None}
+                    call_with_retry('delete', bucket.delete_key, key_name)
+                    response = {'key': key_name, 'is_deleted': True, 'num_keys': 1, 'errors': [], 'message': None}
                 except boto.exception.S3ResponseError as re:
-                    response = {'key': key_name, 'is_deleted': False, 'num_keys': 1, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
+                    response = {'key': key_name, 'is_deleted': False, 'num_keys': 1, 'errors': [], 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
                 except:
-                    response = {'key': key_name, 'is_deleted': False, 'num_keys': 1, 'message': 'Unhandled error occurred when deleting key'}
+                    response = {'key': key_name, 'is_deleted': False, 'num_keys': 1, 'errors': [], 'message': 'Unhandled error occurred when deleting key'}
             else:
-                response = {'key': key_name, 'is_deleted': False, 'num_keys': 1, 'message': res}
+                response = {'key': key_name, 'is_deleted': False, 'num_keys': 1, 'errors': [], 'message': res}
         else:
-            bucket_list, res = get_bucket_list_response((bucket, res), prefix)
-            cnt = count_bucket_list((bucket_list, res))
-            if cnt > 0:
-                try:
-                    for key in bucket_list:
-                        key.delete()
-                    response = {'key': key_name, 'is_deleted': True, 'num_keys': cnt, 'message': None}
-                except boto.exception.S3ResponseError as re:
-                    response = {'key': key_name, 'is_deleted': False, 'num_keys': cnt, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
-                except:
-                    response = {'key': key_name, 'is_deleted': False, 'num_keys': cnt, 'message': 'Unhandled error occurred when deleting key'}
-            elif cnt == 0:
-                response = {'key': key_name, 'is_deleted': False, 'num_keys': cnt, 'message': 'key is not found'}
+            (bucket_list, res), key_filter = get_filtered_bucket_list_response((bucket, res), prefix, pattern, glob, min_size, max_size, modified_since, modified_before)
+            if bucket_list is not None:
+                journal = open_journal(journal_path, {'op': 'delete_keys', 'bucket_name': bucket_name, 'prefix': prefix, 'filter': key_filter['args']}) if journal_path is not None else None
+                num_listed, num_deleted, errors = delete_listed_keys((bucket_list, res), max_workers, list_workers, shards, journal, key_filter)
+                close_journal(journal, all(error['batch'] is not None for error in errors))
+                if len(errors) > 0:
+                    response = {'key': key_name, 'is_deleted': False, 'num_keys': num_deleted, 'errors': errors, 'message': '{0} of {1} keys are not deleted'.format(num_listed - num_deleted, num_listed)}
+                elif num_deleted > 0:
+                    response = {'key': key_name, 'is_deleted': True, 'num_keys': num_deleted, 'errors': errors, 'message': None}
+                else:
+                    response = {'key': key_name, 'is_deleted': False, 'num_keys': num_deleted, 'errors': errors, 'message': 'key is not found'}
             else:
-                response = {'key': key_name, 'is_deleted': False, 'num_keys': cnt, 'message': res}
+                response = {'key': key_name, 'is_deleted': False, 'num_keys': -1, 'errors': [], 'message': res}
     else:
-        response = {'key': key_name, 'is_deleted': False, 'num_keys': None, 'message': res}
+        response = {'key': key_name, 'is_deleted': False, 'num_keys': None, 'errors': [], 'message': res}
     return response
 
 def get_filepath(file_path = None):
@@ -263,95 +1069,833 @@ def get_filepath(file_path = None):
 
 def get_filename(key_name):
     file_name = key_name.rsplit('/')[len(key_name.rsplit('/'))-1]
-    file_name = file_name if file_name is not '' else 'file'
+    file_name = file_name if file_name != '' else 'file'
     return file_name
 
-def download_file(key_res, key_name, file_path = None):
+def get_byte_ranges(size, part_size):
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+## progress file: a JSON header that identifies the object followed by one 'start end md5' line per completed range
+## done maps completed ranges to the hex MD5 of their contents, None for a range that is recorded without one
+def read_range_progress(progress_path, header):
+    done = None
+    if os.path.isfile(progress_path):
+        with open(progress_path) as f:
+            try:
+                is_same = json.loads(f.readline()) == header
+            except ValueError:
+                is_same = False
+            if is_same:
+                done = {}
+                for line in f:
+                    byte_range = line.split()
+                    if len(byte_range) in (2, 3) and line.endswith('\n'):
+                        done[(int(byte_range[0]), int(byte_range[1]))] = byte_range[2] if len(byte_range) == 3 else None
+    return done
+
+## ETag of a multipart upload: the MD5 of the MD5 digests of its parts and the number of parts
+def get_multipart_etag(digests):
+    return '"{0}-{1}"'.format(hashlib.md5(b''.join(digests)).hexdigest(), len(digests))
+
+def get_etag_parts_count(etag):
+    parts = (etag or '').strip('"').split('-')
+    return int(parts[1]) if len(parts) == 2 and parts[1].isdigit() else None
+
+## parts of a multipart object are as large as its first part except the last one - S3 reports the size of
+## the first part for a HEAD request of partNumber=1, None if it does not or the number of parts does not add up
+def get_etag_part_size(key, num_parts):
+    try:
+        resp = call_with_retry('validate', key.bucket.connection.make_request, 'HEAD', key.bucket.name, key.name, query_args='partNumber=1')
+        resp.read()
+        part_size = int(resp.getheader('content-length')) if 200 <= resp.status < 300 else None
+    except (boto.exception.S3ResponseError, socket.error, http_client.HTTPException, TypeError, ValueError):
+        part_size = None
+    if part_size is None or part_size <= 0 or int(math.ceil(key.size / float(part_size))) != num_parts:
+        part_size = None
+    return part_size
+
+## digest of contents that are read in order, as S3 computes their ETag - the MD5 of the contents or, with part_size,
+## the multipart ETag of parts of part_size bytes
+def new_etag_digest(part_size = None):
+    return {'part_size': part_size, 'md5': hashlib.md5(), 'num_bytes': 0, 'digests': []}
+
+def update_etag_digest(digest, data):
+    part_size = digest['part_size']
+    while len(data) > 0:
+        size = len(data) if part_size is None else min(len(data), part_size - digest['num_bytes'])
+        digest['md5'].update(data[:size] if size < len(data) else data)
+        digest['num_bytes'] += size
+        data = data[size:]
+        if part_size is not None and digest['num_bytes'] == part_size:
+            digest['digests'].append(digest['md5'].digest())
+            digest['md5'], digest['num_bytes'] = hashlib.md5(), 0
+
+def get_digest_etag(digest):
+    if digest['part_size'] is None:
+        return '"{0}"'.format(digest['md5'].hexdigest())
+    return get_multipart_etag(digest['digests'] + ([digest['md5'].digest()] if digest['num_bytes'] > 0 else []))
+
+def digest_chunks(digest, chunks):
+    for chunk in chunks:
+        update_etag_digest(digest, chunk)
+        yield chunk
+
+## a key whose contents are being read is verified against its ETag, except if the ETag is not MD5 based as for
+## SSE-KMS objects, or it is a multipart ETag of which part_size is not known - None is returned then
+## part_size is looked up by get_etag_part_size beforehand so that no S3 call is made while the contents are read
+def get_key_digest(key, part_size = None):
+    if key.etag is None or key.encrypted == 'aws:kms':
+        return None
+    num_parts = get_etag_parts_count(key.etag)
+    if num_parts is None:
+        return new_etag_digest()
+    if part_size is None or int(math.ceil(key.size / float(part_size))) != num_parts:
+        return None
+    return new_etag_digest(part_size)
+
+def verify_etag(etag, computed_etag):
+    if etag.strip('"') != computed_etag.strip('"'):
+        raise boto.exception.S3DataError('ETag {0} does not match {1} computed from contents'.format(etag, computed_etag))
+
+## as boto sets it when a key is downloaded to a file
+def set_modified_time(full_path, last_modified):
+    modified_tuple = email.utils.parsedate_tz(last_modified) if last_modified is not None else None
+    if modified_tuple is not None:
+        modified = int(email.utils.mktime_tz(modified_tuple))
+        os.utime(full_path, (modified, modified))
+
+## journal of a bulk job: a JSON header that identifies the job followed by one JSON record per line -
+##   {'marker': name}: every item up to and including name in the job's order is finished
+##   {'done': name}: name is finished, written for items finished after an earlier item failed
+##   {'upload': key_name, 'upload_id': id, ...}: a multipart upload is in flight, {'uploaded': key_name}: it is completed
+## records are flushed as they are written and synced to disk every JOURNAL_SYNC_RECORDS records or
+## JOURNAL_SYNC_SECONDS, markers are written as often - a crash loses at most that much progress
+JOURNAL_SYNC_RECORDS = 1000
+JOURNAL_SYNC_SECONDS = 1.0
+
+## a journal of another job is replaced, as a progress file of ranges is
+def open_journal(journal_path, header):
+    journal = {'path': journal_path, 'marker': None, 'done': set(), 'uploads': {}, 'failed': False, 'lock': threading.Lock(), 'pending': 0, 'unsaved': 0, 'synced': time.time()}
+    is_same = False
+    if os.path.isfile(journal_path):
+        with open(journal_path) as f:
+            try:
+                is_same = json.loads(f.readline()) == header
+            except ValueError:
+                is_same = False
+            if is_same:
+                for line in f:
+                    try:
+                        record = json.loads(line) if line.endswith('\n') else None
+                    except ValueError:
+                        record = None
+                    if record is None:
+                        break
+                    if 'marker' in record:
+                        journal['marker'] = record['marker']
+                    elif 'done' in record:
+                        journal['done'].add(record['done'])
+                    elif 'upload' in record:
+                        journal['uploads'][record['upload']] = record
+                    elif 'uploaded' in record:
+                        journal['uploads'].pop(record['uploaded'], None)
+    if not is_same:
+        with open(journal_path, 'w') as f:
+            f.write(json.dumps(header, sort_keys=True) + '\n')
+    journal['file'] = open(journal_path, 'a')
+    return journal
+
+def sync_journal(journal):
+    journal['file'].flush()
+    os.fsync(journal['file'].fileno())
+    journal['pending'], journal['unsaved'], journal['synced'] = 0, 0, time.time()
+
+def is_journal_due(journal):
+    return journal['pending'] + journal['unsaved'] >= JOURNAL_SYNC_RECORDS or time.time() - journal['synced'] >= JOURNAL_SYNC_SECONDS
+
+def write_journal(journal, record):
+    if journal is not None:
+        with journal['lock']:
+            journal['file'].write(json.dumps(record, sort_keys=True) + '\n')
+            journal['file'].flush()
+            journal['pending'] += 1
+            if is_journal_due(journal):
+                if journal['unsaved'] > 0:
+                    journal['file'].write(json.dumps({'marker': journal['marker']}) + '\n')
+                sync_journal(journal)
+
+## results are recorded in the job's order - the marker advances over finished items until one fails,
+## after which finished items are recorded one by one
+def record_journal(journal, name, is_done):
+    if journal is not None:
+        if not is_done:
+            journal['failed'] = True
+        elif journal['failed']:
+            write_journal(journal, {'done': name})
+        else:
+            with journal['lock']:
+                journal['marker'] = name
+                journal['unsaved'] += 1
+                if is_journal_due(journal):
+                    journal['file'].write(json.dumps({'marker': name}) + '\n')
+                    sync_journal(journal)
+
+def is_journaled(journal, name, order_key = lambda name: name):
+    return journal is not None and (name in journal['done'] or (journal['marker'] is not None and order_key(name) <= order_key(journal['marker'])))
+
+## the journal is removed once the job is finished without failures, a later run starts a new job
+def close_journal(journal, is_finished = False):
+    if journal is not None:
+        with journal['lock']:
+            if journal['unsaved'] > 0:
+                journal['file'].write(json.dumps({'marker': journal['marker']}) + '\n')
+            sync_journal(journal)
+            journal['file'].close()
+        if is_finished and not journal['failed']:
+            os.remove(journal['path'])
+
+## S3 lists keys in the order of their UTF-8 bytes
+def get_key_order(name):
+    return name.encode('utf-8') if not isinstance(name, bytes) else name
+
+## with verify, a range that is received short is downloaded again and the contents of a multipart object are
+## verified against its ETag - ranges are then aligned with its parts, whose MD5s boto computes as they are written
+## the MD5 of an object that is not uploaded in parts covers its whole contents, ranges of it are not verified
+def download_file_ranges(key_res, key_name, file_path = None, part_size = DEFAULT_PART_SIZE, max_workers = 1, verify = True):
     file_path = get_filepath(file_path)
     file_name = get_filename(key_name)
     key, res = key_res
     if key is not None:
+        full_path = os.path.join(file_path, file_name)
+        progress_path = full_path + '.parts'
+        num_parts = get_etag_parts_count(key.etag) if verify else None
+        etag_part_size = get_etag_part_size(key, num_parts) if num_parts is not None else None
+        part_size = etag_part_size or part_size
+        header = {'key_name': key.name, 'size': key.size, 'etag': key.etag, 'part_size': part_size}
+        done = read_range_progress(progress_path, header)
+        if done is None or not os.path.isfile(full_path) or os.path.getsize(full_path) != key.size:
+            done = {}
+            with open(full_path, 'wb') as f:
+                f.truncate(key.size)
+            with open(progress_path, 'w') as f:
+                f.write(json.dumps(header, sort_keys=True) + '\n')
+        ranges = [byte_range for byte_range in get_byte_ranges(key.size, part_size) if byte_range not in done]
+        lock = threading.Lock()
+        progress = open(progress_path, 'a')
+        encrypted = set()
+        def download_range(bucket_res, byte_range):
+            bucket, _ = bucket_res
+            start, end = byte_range
+            range_key = Key(bucket, key.name)
+            def get_range():
+                with open(full_path, 'r+b') as f:
+                    f.seek(start)
+                    range_key.get_file(f, headers={'Range': 'bytes={0}-{1}'.format(start, end), 'If-Match': key.etag})
+                    num_bytes = f.tell() - start
+                if verify and num_bytes != end - start + 1:
+                    raise boto.exception.S3DataError('bytes {0}-{1}: {2} bytes are received'.format(start, end, num_bytes))
+            try:
+                call_with_retry('download', get_range)
+                md5 = binascii.hexlify(range_key.local_hashes['md5']).decode('ascii') if 'md5' in range_key.local_hashes else None
+                with lock:
+                    done[byte_range] = md5
+                    encrypted.add(range_key.encrypted)
+                    progress.write('{0} {1} {2}\n'.format(start, end, md5) if md5 is not None else '{0} {1}\n'.format(start, end))
+                    progress.flush()
+                message = None
+            except boto.exception.S3ResponseError as re:
+                message = 'bytes {0}-{1}: S3ResponseError = {2} {3}'.format(start, end, re[0], re[1])
+            except boto.exception.S3DataError as de:
+                message = 'S3DataError = {0}'.format(de.reason)
+            except:
+                message = 'bytes {0}-{1}: Unhandled error occurred when downloading range'.format(start, end)
+            return message
+        try:
+            errors = [message for message in map_in_workers((key.bucket, None), download_range, ranges, max_workers) if message is not None]
+        finally:
+            progress.close()
+        if len(errors) == 0 and etag_part_size is not None and 'aws:kms' not in encrypted and all(md5 is not None for md5 in done.values()):
+            computed_etag = get_multipart_etag([binascii.unhexlify(done[byte_range]) for byte_range in sorted(done)])
+            if computed_etag.strip('"') != key.etag.strip('"'):
+                errors.append('ETag {0} does not match {1} computed from contents'.format(key.etag, computed_etag))
+                os.remove(progress_path)
+        if len(errors) == 0:
+            os.remove(progress_path)
+            set_modified_time(full_path, key.last_modified)
+            response = {'key_name': key_name, 'is_downloaded': True, 'file_path': file_path, 'file_name': file_name, 'message': None}
+        elif not os.path.isfile(progress_path):
+            response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': '{0}, download again'.format(errors[0])}
+        else:
+            response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': '{0} of {1} ranges failed, download again to resume - {2}'.format(len(errors), len(ranges), errors[0])}
+    else:
+        response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': res}
+    return response
+
+## if decompress, contents whose Content-Encoding is one of CODECS are decompressed as they are written,
+## such keys are downloaded in a single stream as ranges of compressed contents cannot be decompressed on their own
+## with verify, contents are hashed as they are received and a download that does not match the ETag is retried
+def download_file(key_res, key_name, file_path = None, multipart_threshold = None, part_size = DEFAULT_PART_SIZE, max_workers = 1, decompress = True, verify = True):
+    file_path = get_filepath(file_path)
+    file_name = get_filename(key_name)
+    key, res = key_res
+    if key is not None and multipart_threshold is not None and key.size >= multipart_threshold and not (decompress and key.content_encoding in CODECS):
+        response = download_file_ranges(key_res, key_name, file_path, part_size, max_workers, verify)
+    elif key is not None:
+        full_path = os.path.join(file_path, file_name)
         try:
-            key.get_contents_to_filename(os.path.join(file_path, file_name))
+            num_parts = get_etag_parts_count(key.etag) if verify else None
+            etag_part_size = get_etag_part_size(key, num_parts) if num_parts is not None else None
+            ## a new digest for every attempt, of the ETag that the GET returns
+            def get_contents():
+                key.close(fast=True)
+                key.open_read()
+                digest = get_key_digest(key, etag_part_size) if verify else None
+                chunks = iter(lambda: key.read(STREAM_CHUNK_SIZE), b'')
+                if digest is not None:
+                    chunks = digest_chunks(digest, chunks)
+                with open(full_path, 'wb') as f:
+                    for chunk in (decode_chunks(chunks, key.content_encoding) if decompress else chunks):
+                        f.write(chunk)
+                if digest is not None:
+                    verify_etag(key.etag, get_digest_etag(digest))
+            call_with_retry('download', get_contents)
+            ## decoded contents are not the object whose Last-Modified is kept
+            if not (decompress and key.content_encoding in CODECS):
+                set_modified_time(full_path, key.last_modified)
             response = {'key_name': key_name, 'is_downloaded': True, 'file_path': file_path, 'file_name': file_name, 'message': None}
         except boto.exception.S3ResponseError as re:
             response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
+        except boto.exception.S3DataError as de:
+            response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'S3DataError = {0}'.format(de.reason)}
+        except zlib.error as ze:
+            response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'zlib error = {0}'.format(ze)}
         except:
             response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'Unhandled error occurred when downloading file'}
     else:
         response = {'key_name': key_name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': res}
     return response
 
-def download_files(conn_res, bucket_name, file_path = None, key_name = None, pattern = None, prefix = None):
+def download_listed_file(bucket_res, key, file_path = None, multipart_threshold = None, part_size = DEFAULT_PART_SIZE, max_workers = 1, decompress = True, verify = True):
+    bucket, res = bucket_res
+    key_str = str(key.key)
+    if key.bucket is not bucket:
+        listed_key = key
+        key = Key(bucket, listed_key.name)
+        key.size, key.etag = listed_key.size, listed_key.etag
+    ## a listing has no Content-Encoding, it is looked up before a key is split into ranges
+    if decompress and multipart_threshold is not None and key.size >= multipart_threshold:
+        head = call_with_retry('validate', bucket.get_key, key.name)
+        key.content_encoding = head.content_encoding if head is not None else None
+    return download_file((key, key_str), key_str, file_path, multipart_threshold, part_size, max_workers, decompress, verify)
+
+## journal_path: journal of a listed download, a rerun of an interrupted job skips keys that are downloaded -
+## keys finished by an earlier run are not in the response, ranges of a key resume from its progress file
+## without key_name, the keys under prefix that match the filter of compile_key_filter are downloaded
+def download_files(conn_res, bucket_name, file_path = None, key_name = None, pattern = None, prefix = None, max_workers = 1, multipart_threshold = None, part_size = DEFAULT_PART_SIZE, list_workers = 1, shards = None, decompress = True, journal_path = None, verify = True, glob = None, min_size = None, max_size = None, modified_since = None, modified_before = None):
     bucket_res = get_bucket_response(conn_res, bucket_name)
     response = []
     if key_name is not None:
         key_res = get_key_response(bucket_res, key_name)
-        response.append(download_file(key_res, key_name, file_path))
-    else:
-        bucket_list, res = get_bucket_list_response(bucket_res, prefix)
-        cnt = count_bucket_list((bucket_list, res))
-        if cnt > 0:
-            pattern = pattern if pattern is not None else '.+'
-            flag = 1
-            for key in bucket_list:
-                if flag > 0:
-                    key_str = str(key.key)
-                    try:
-                        re.search(pattern, key_str)
-                    except re.error as e:
-                        flag = 0
-                        res = 'invalid pattern: {0}'.format(str(e))
-                        break
-            if flag > 0:
-                for key in bucket_list:
-                    key_str = str(key.key)
-                    if re.search(pattern, key_str) is not None:
-                        response.append(download_file((key, key_str), key_str, file_path))
-            else:
-                response.append({'key_name': None, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': res})
-            if len(response) == 0:
+        response.append(download_file(key_res, key_name, file_path, multipart_threshold, part_size, max_workers, decompress, verify))
+    else:
+        (bucket_list, res), key_filter = get_filtered_bucket_list_response(bucket_res, prefix, pattern, glob, min_size, max_size, modified_since, modified_before)
+        if bucket_list is not None:
+            listing = {'cnt': 0}
+            journal = open_journal(journal_path, {'op': 'download_files', 'bucket_name': bucket_name, 'file_path': os.path.abspath(get_filepath(file_path)), 'prefix': prefix, 'filter': key_filter['args'], 'decompress': decompress}) if journal_path is not None else None
+            resume_bucket_list(bucket_list, journal, list_workers, shards)
+            def matched_keys():
+                for page in get_list_pages((bucket_list, res), list_workers, shards):
+                    listing['cnt'] += len(page)
+                    for key in page:
+                        if is_key_matched(key_filter, key) and not is_journaled(journal, key.name, get_key_order):
+                            yield key
+            download = lambda bucket_res, key: (key.name, download_listed_file(bucket_res, key, file_path, multipart_threshold, part_size, max_workers, decompress, verify))
+            is_finished = False
+            try:
+                for name, result in map_in_workers(bucket_res, download, matched_keys(), max_workers):
+                    response.append(result)
+                    record_journal(journal, name, result['is_downloaded'])
+                is_finished = True
+            finally:
+                close_journal(journal, is_finished)
+            cnt = listing['cnt']
+            ## an empty listing narrowed to the literal prefix of the filter says nothing of the rest of the bucket
+            if cnt == 0 and get_filter_prefix(prefix, key_filter) == prefix:
+                response.append({'key_name': None, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'there is no key in the bucket'})
+            elif len(response) == 0:
                 response.append({'key_name': None, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'key is not found'})
-        elif cnt == 0:
-            response.append({'key_name': None, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'there is no key in the bucket'})
         else:
             response.append({'key_name': None, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': res})
     return response
 
-def upload_file(conn_res, bucket_name, file_path, file_name, prefix = None):
+def get_codec_error(codec):
+    if codec not in CODECS:
+        message = 'codec should be one of {0}'.format(', '.join(CODECS))
+    elif codec == 'zstd' and zstandard is None:
+        message = 'zstandard module is required for zstd codec'
+    else:
+        message = None
+    return message
+
+def get_compressor(codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor().compressobj()
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+## gzip also decompresses zlib data
+def get_decompressor(codec):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj(32 + zlib.MAX_WBITS)
+
+def compress_chunks(chunks, codec):
+    compressor = get_compressor(codec)
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+## data is decompressed chunk by chunk, concatenated gzip members are decompressed in turn
+def decompress_chunks(chunks, codec = 'gzip'):
+    decompressor = get_decompressor(codec)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk)
+            chunk = getattr(decompressor, 'unused_data', b'')
+            if chunk:
+                yield decompressor.flush()
+                decompressor = get_decompressor(codec)
+    if codec != 'zstd':
+        yield decompressor.flush()
+
+## chunks of a response are decompressed if its Content-Encoding is one of CODECS
+def decode_chunks(chunks, content_encoding):
+    return decompress_chunks(chunks, content_encoding) if content_encoding in CODECS else chunks
+
+## key contents are passed to write chunk by chunk, they are never held in memory or written to disk as a whole
+def stream_key(key_res, key_name, write, decompress = False, chunk_size = STREAM_CHUNK_SIZE):
+    key, res = key_res
+    if key is not None:
+        num_bytes = 0
+        try:
+            def get_contents():
+                key.close(fast=True)
+                key.open_read()
+            call_with_retry('download', get_contents)
+            chunks = iter(lambda: key.read(chunk_size), b'')
+            for chunk in (decode_chunks(chunks, key.content_encoding) if decompress else chunks):
+                if chunk:
+                    write(chunk)
+                    num_bytes += len(chunk)
+            response = {'key_name': key_name, 'is_streamed': True, 'num_bytes': num_bytes, 'message': None}
+        except boto.exception.S3ResponseError as re:
+            response = {'key_name': key_name, 'is_streamed': False, 'num_bytes': num_bytes, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
+        except zlib.error as ze:
+            response = {'key_name': key_name, 'is_streamed': False, 'num_bytes': num_bytes, 'message': 'zlib error = {0}'.format(ze)}
+        except:
+            response = {'key_name': key_name, 'is_streamed': False, 'num_bytes': num_bytes, 'message': 'Unhandled error occurred when streaming key'}
+        finally:
+            key.close(fast=True)
+    else:
+        response = {'key_name': key_name, 'is_streamed': False, 'num_bytes': 0, 'message': res}
+    return response
+
+def get_upload_key_name(prefix, file_name):
+    if prefix is None or prefix == '':
+        prefix = '/'
+    elif prefix[0:1] != '/':
+        prefix = '/' + prefix
+    else:
+        prefix = prefix
+    return os.path.join(prefix, file_name).replace('\\', '/')
+
+def get_multipart_part_size(size, part_size = DEFAULT_PART_SIZE):
+    return max(part_size, MIN_PART_SIZE, int(math.ceil(size / float(MAX_PARTS))))
+
+## a part is sent from the buffer on which its MD5 is computed - boto checks the MD5 against the ETag that S3
+## returns and a part that does not match is uploaded again on its own
+def upload_part_data(mp, part_num, data):
+    md5 = hashlib.md5(data)
+    mp.upload_part_from_file(io.BytesIO(data), part_num, md5 = (md5.hexdigest(), base64.b64encode(md5.digest()).decode('ascii')), size = len(data))
+    return md5.digest()
+
+## parts: (part_num, upload) pairs where upload(mp) uploads the part to the multipart upload mp and returns its MD5 digest,
+## parts are taken up to max_pending ahead of the uploads - digests of parts that are already uploaded are passed as digests
+## and the ETag of the completed upload is verified against the digests of all parts
+## an upload that is initiated here is aborted if a part fails, one that is passed as mp is kept to be resumed
+def upload_parts(bucket_res, key_name, parts, max_workers = 1, headers = None, max_pending = 1000, mp = None, digests = None):
+    bucket, res = bucket_res
+    is_resumable = mp is not None
+    digests = dict(digests or {})
+    if not is_resumable:
+        mp = call_with_retry('multipart', bucket.initiate_multipart_upload, key_name, headers)
+    def upload_part(bucket_res, part):
+        part_num, upload = part
+        part_mp = MultiPartUpload(bucket_res[0])
+        part_mp.key_name, part_mp.id = mp.key_name, mp.id
+        def upload_part_from_file():
+            return upload(part_mp)
+        try:
+            digests[part_num] = call_with_retry('upload', upload_part_from_file)
+            message = None
+        except boto.exception.S3ResponseError as re:
+            message = 'part {0}: S3ResponseError = {1} {2}'.format(part_num, re[0], re[1])
+        except boto.exception.S3DataError as de:
+            message = 'part {0}: S3DataError = {1}'.format(part_num, de.reason)
+        except:
+            message = 'part {0}: Unhandled error occurred when uploading part'.format(part_num)
+        return message
+    try:
+        errors = [message for message in map_in_workers(bucket_res, upload_part, parts, max_workers, max_pending) if message is not None]
+        if len(errors) == 0:
+            completed = call_with_retry('multipart', mp.complete_upload)
+            computed_etag = get_multipart_etag([digests[part_num] for part_num in sorted(digests)])
+            if completed.etag is not None and completed.etag.strip('"') != computed_etag.strip('"'):
+                message = 'ETag {0} of the completed upload does not match {1} computed from parts'.format(completed.etag, computed_etag)
+            else:
+                message = None
+        elif is_resumable:
+            message = '{0} parts failed, multipart upload {1} is kept to be resumed - {2}'.format(len(errors), mp.id, errors[0])
+        else:
+            call_with_retry('multipart', mp.cancel_upload)
+            message = '{0} parts failed, multipart upload is aborted - {1}'.format(len(errors), errors[0])
+    except:
+        if not is_resumable:
+            call_with_retry('multipart', mp.cancel_upload)
+        raise
+    return message
+
+## a multipart upload of a journal is resumed if the file is unchanged - its uploaded parts are listed
+## from S3, which is the record of part-level progress, and parts of a different size are uploaded again
+def get_resumed_upload(bucket, journal, key_name, upload):
+    record = journal['uploads'].get(key_name)
+    if record is None or any(record.get(name) != upload[name] for name in ['size', 'modified', 'part_size']):
+        return (None, {})
+    mp = MultiPartUpload(bucket)
+    mp.key_name, mp.id = key_name, record['upload_id']
+    def get_all_parts():
+        return dict((part.part_number, (part.size, part.etag)) for part in mp)
+    try:
+        uploaded = call_with_retry('multipart', get_all_parts)
+    except boto.exception.S3ResponseError as re:
+        if re[0] != 404:
+            raise
+        mp, uploaded = None, {}
+    return (mp, uploaded)
+
+## with a journal, an interrupted upload is kept and resumed by a later run
+def upload_file_parts(bucket_res, full_path, key_name, part_size = DEFAULT_PART_SIZE, max_workers = 1, journal = None):
+    bucket, res = bucket_res
+    size = os.path.getsize(full_path)
+    part_size = get_multipart_part_size(size, part_size)
+    mp, uploaded = None, {}
+    if journal is not None:
+        upload = {'upload': key_name, 'size': size, 'modified': int(os.path.getmtime(full_path)), 'part_size': part_size}
+        mp, uploaded = get_resumed_upload(bucket, journal, key_name, upload)
+        if mp is None:
+            mp = call_with_retry('multipart', bucket.initiate_multipart_upload, key_name)
+            write_journal(journal, dict(upload, upload_id=mp.id))
+    def get_part(part_num, start, end):
+        def upload(mp):
+            with open(full_path, 'rb') as f:
+                f.seek(start)
+                data = f.read(end - start + 1)
+            return upload_part_data(mp, part_num, data)
+        return (part_num, upload)
+    ranges = list(enumerate(get_byte_ranges(size, part_size), 1))
+    digests = dict((part_num, binascii.unhexlify(uploaded[part_num][1].strip('"'))) for part_num, (start, end) in ranges if uploaded.get(part_num, (None, None))[0] == end - start + 1)
+    parts = (get_part(part_num, start, end) for part_num, (start, end) in ranges if part_num not in digests)
+    message = upload_parts(bucket_res, key_name, parts, max_workers, None, 1000, mp, digests)
+    if journal is not None and message is None:
+        write_journal(journal, {'uploaded': key_name})
+    return message
+
+## compressed contents of a file in parts of at least part_size bytes, the last part may be smaller
+def get_compressed_parts(full_path, codec, part_size = DEFAULT_PART_SIZE, chunk_size = STREAM_CHUNK_SIZE):
+    with open(full_path, 'rb') as f:
+        buffered, size = [], 0
+        for data in compress_chunks(iter(lambda: f.read(chunk_size), b''), codec):
+            buffered.append(data)
+            size += len(data)
+            if size >= part_size:
+                yield b''.join(buffered)
+                buffered, size = [], 0
+        if size > 0 or len(buffered) == 0:
+            yield b''.join(buffered)
+
+## a file is compressed while its parts are uploaded - compression runs ahead of the uploads by up to
+## max_workers parts, so that at most about max_workers + 1 compressed parts are held in memory
+def upload_compressed_file(bucket_res, full_path, key_name, codec, part_size = DEFAULT_PART_SIZE, max_workers = 1):
+    bucket, res = bucket_res
+    headers = {'Content-Encoding': codec, 'Content-Type': mimetypes.guess_type(key_name)[0] or 'application/octet-stream'}
+    size = os.path.getsize(full_path)
+    parts = enumerate(get_compressed_parts(full_path, codec, get_multipart_part_size(size, part_size)), 1)
+    first, second = next(parts), next(parts, None)
+    if second is None:
+        key = bucket.new_key(key_name)
+        call_with_retry('upload', key.set_contents_from_string, first[1], headers)
+        message = None
+    else:
+        def get_part(part):
+            part_num, data = part
+            return (part_num, lambda mp: upload_part_data(mp, part_num, data))
+        message = upload_parts(bucket_res, key_name, (get_part(part) for part in itertools.chain([first, second], parts)), max_workers, headers, max(max_workers, 1))
+    return message
+
+## if codec is one of CODECS, contents are compressed and stored with the codec as Content-Encoding
+def upload_to_bucket(bucket_res, file_path, file_name, prefix = None, multipart_threshold = None, part_size = DEFAULT_PART_SIZE, max_workers = 1, key_name = None, codec = None, journal = None):
+    full_path = os.path.join(file_path, file_name)
+    bucket, res = bucket_res
+    if bucket is not None:
+        full_key_name = key_name if key_name is not None else get_upload_key_name(prefix, file_name)
+        invalidate_cached_metadata(bucket.connection.host, bucket.name, full_key_name)
+        try:
+            if codec is not None:
+                message = get_codec_error(codec) or upload_compressed_file(bucket_res, full_path, full_key_name, codec, part_size, max_workers)
+            elif multipart_threshold is not None and os.path.getsize(full_path) >= max(multipart_threshold, 1):
+                message = upload_file_parts(bucket_res, full_path, full_key_name, part_size, max_workers, journal)
+            else:
+                key = bucket.new_key(full_key_name)
+                call_with_retry('upload', key.set_contents_from_filename, full_path)
+                message = None
+            if message is None:
+                response = {'file_name': file_name, 'is_uploaded': True, 'key_name': full_key_name, 'message': None}
+            else:
+                response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': message}
+        except boto.exception.S3ResponseError as re:
+            response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
+        except:
+            response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': 'Unhandled error occurred when uploading file'}
+    else:
+        response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': res}
+    return response
+
+## journal_path: journal of a multipart upload, a rerun of an interrupted upload uploads the missing parts only
+## compressed uploads are not resumed, their parts are known only once the file is compressed again
+def upload_file(conn_res, bucket_name, file_path, file_name, prefix = None, multipart_threshold = None, part_size = DEFAULT_PART_SIZE, max_workers = 1, codec = None, journal_path = None):
     full_path = os.path.join(file_path, file_name)
     if os.path.isfile(full_path):
-        if prefix is None or prefix is '':
-            prefix = '/'
-        elif prefix[0:1] is not '/':
-            prefix = '/' + prefix
-        else:
-            prefix = prefix
-        bucket, res = get_bucket_response(conn_res, bucket_name)
+        bucket_res = get_bucket_response(conn_res, bucket_name)
+        journal = open_journal(journal_path, {'op': 'upload_file', 'bucket_name': bucket_name, 'file_path': os.path.abspath(full_path), 'prefix': prefix}) if journal_path is not None else None
+        try:
+            response = upload_to_bucket(bucket_res, file_path, file_name, prefix, multipart_threshold, part_size, max_workers, None, codec, journal)
+            record_journal(journal, file_name, response['is_uploaded'])
+        finally:
+            close_journal(journal, True)
+    else:
+        response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': 'file is not found'}
+    return response
+
+def walk_file_names(file_path):
+    for root, dirs, files in os.walk(file_path):
+        dirs.sort()
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), file_path)
+
+## the order of walk_file_names - the files of a directory come before its subdirectories
+def get_walk_order(file_name):
+    names = file_name.split(os.sep)
+    return [(1, name) for name in names[:-1]] + [(0, names[-1])]
+
+## journal_path: journal of the upload, a rerun of an interrupted job skips files that are uploaded and
+## resumes multipart uploads - files finished by an earlier run are not in the response
+def upload_files(conn_res, bucket_name, file_path, prefix = None, max_workers = 1, multipart_threshold = None, part_size = DEFAULT_PART_SIZE, codec = None, journal_path = None):
+    if os.path.isdir(file_path):
+        bucket_res = get_bucket_response(conn_res, bucket_name)
+        bucket, res = bucket_res
         if bucket is not None:
-            full_key_name = os.path.join(prefix, file_name).replace('\\', '/')
-            key = bucket.new_key(full_key_name)
+            journal = open_journal(journal_path, {'op': 'upload_files', 'bucket_name': bucket_name, 'file_path': os.path.abspath(file_path), 'prefix': prefix, 'codec': codec}) if journal_path is not None else None
+            upload = lambda bucket_res, file_name: upload_to_bucket(bucket_res, file_path, file_name, prefix, multipart_threshold, part_size, max_workers, None, codec, journal)
+            journal_name = os.path.relpath(os.path.abspath(journal_path), os.path.abspath(file_path)) if journal_path is not None else None
+            file_names = (file_name for file_name in walk_file_names(file_path) if file_name != journal_name and not is_journaled(journal, file_name, get_walk_order))
+            response, is_finished = [], False
             try:
-                key.set_contents_from_filename(os.path.join(file_path, file_name))
-                response = {'file_name': file_name, 'is_uploaded': True, 'key_name': full_key_name, 'message': None}
-            except boto.exception.S3ResponseError as re:
-                response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
-            except:
-                response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': 'Unhandled error occurred when uploading file'}
+                for result in map_in_workers(bucket_res, upload, file_names, max_workers):
+                    response.append(result)
+                    record_journal(journal, result['file_name'], result['is_uploaded'])
+                is_finished = True
+            finally:
+                close_journal(journal, is_finished)
+            if len(response) == 0:
+                response = [{'file_name': None, 'is_uploaded': False, 'key_name': None, 'message': 'file is not found'}]
         else:
-            response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': res}
+            response = [{'file_name': None, 'is_uploaded': False, 'key_name': None, 'message': res}]
     else:
-        response = {'file_name': file_name, 'is_uploaded': False, 'key_name': None, 'message': 'file is not found'}
+        response = [{'file_name': None, 'is_uploaded': False, 'key_name': None, 'message': 'directory is not found'}]
     return response
 
-def copy_file(conn_res, src_bucket_name, src_key_name, dst_bucket_name, dst_key_name):
-    src_bucket_res = get_bucket_response(conn_res, src_bucket_name)
-    src_key, src_res = get_key_response(src_bucket_res, src_key_name)
+def get_sync_prefix(prefix = None):
+    prefix = (prefix or '').replace('\\', '/').strip('/')
+    return prefix + '/' if prefix != '' else ''
+
+## last_modified of a listing, eg 2015-11-06T01:02:03.000Z, as seconds since epoch
+def get_modified_time(last_modified):
+    return calendar.timegm(time.strptime(last_modified[:19], '%Y-%m-%dT%H:%M:%S'))
+
+def get_file_md5(full_path, chunk_size = 1024 * 1024):
+    md5 = hashlib.md5()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+## a file is unchanged if its size is the same and it is not older (download) or newer (upload) than the key
+## with use_md5, a file of the same size is compared by MD5 instead, except for multipart ETags that are not MD5s
+def is_file_changed(full_path, size, last_modified, etag, use_md5 = False, direction = 'download'):
+    if not os.path.isfile(full_path) or os.path.getsize(full_path) != size:
+        is_changed = True
+    elif use_md5 and etag is not None and '-' not in etag:
+        is_changed = get_file_md5(full_path) != etag.strip('"')
+    elif direction == 'download':
+        is_changed = int(os.path.getmtime(full_path)) < get_modified_time(last_modified)
+    else:
+        is_changed = int(os.path.getmtime(full_path)) > get_modified_time(last_modified)
+    return is_changed
+
+## relative names of the files under file_path, separated by '/', in the order in which S3 lists key names -
+## a directory sorts as its name followed by '/' among the files beside it, eg a.txt, a/b.txt, a0.txt
+def walk_key_names(file_path, rel_path = ''):
+    entries = []
+    for name in os.listdir(os.path.join(file_path, rel_path)):
+        full_path = os.path.join(file_path, rel_path, name)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            entries.append((rel_path + name + '/', True))
+        elif os.path.isfile(full_path):
+            entries.append((rel_path + name, False))
+    for rel_name, is_dir in sorted(entries, key=lambda entry: get_key_order(entry[0])):
+        if is_dir:
+            for name in walk_key_names(file_path, rel_name):
+                yield name
+        else:
+            yield rel_name
+
+## (rel_name, key, file_name) of the keys listed under sync_prefix merged with the local files of walk_key_names,
+## key or file_name is None for a name on one side only - neither side is held in memory
+def join_sync_names(pages, sync_prefix, file_names):
+    keys = ((key.name[len(sync_prefix):], key) for page in pages for key in page)
+    keys = ((rel_name, key) for rel_name, key in keys if rel_name != '' and not rel_name.endswith('/'))
+    key_item, file_name = next(keys, None), next(file_names, None)
+    while key_item is not None or file_name is not None:
+        key_order = get_key_order(key_item[0]) if key_item is not None else None
+        file_order = get_key_order(file_name) if file_name is not None else None
+        if file_name is None or (key_item is not None and key_order < file_order):
+            yield (key_item[0], key_item[1], None)
+            key_item = next(keys, None)
+        elif key_item is None or file_order < key_order:
+            yield (file_name, None, file_name)
+            file_name = next(file_names, None)
+        else:
+            yield (key_item[0], key_item[1], file_name)
+            key_item, file_name = next(keys, None), next(file_names, None)
+
+def get_sync_response(bucket_name, prefix, direction, stats, errors):
+    response = {'bucket_name': bucket_name, 'prefix': prefix, 'direction': direction, 'is_synced': len(errors) == 0, 'errors': errors, 'message': None if len(errors) == 0 else '{0} errors occurred when syncing'.format(len(errors))}
+    response.update(stats)
+    return response
+
+def sync_download(conn_res, bucket_name, file_path, prefix = None, use_md5 = False, delete = False, max_workers = 1, multipart_threshold = None, part_size = DEFAULT_PART_SIZE):
+    stats = {'num_transferred': 0, 'bytes_transferred': 0, 'num_skipped': 0, 'bytes_skipped': 0, 'num_deleted': 0}
+    errors = []
+    sync_prefix = get_sync_prefix(prefix)
+    bucket_res = get_bucket_response(conn_res, bucket_name)
+    bucket_list, res = get_bucket_list_response(bucket_res, sync_prefix)
+    if bucket_list is not None:
+        ## files that are not listed, deleted once all keys are downloaded
+        unlisted = []
+        def changed_keys():
+            for rel_name, key, file_name in join_sync_names(get_bucket_list_pages((bucket_list, res)), sync_prefix, walk_key_names(file_path)):
+                full_path = os.path.join(file_path, *rel_name.split('/'))
+                if key is None:
+                    unlisted.append(full_path)
+                elif file_name is not None and not is_file_changed(full_path, key.size, key.last_modified, key.etag, use_md5, 'download'):
+                    stats['num_skipped'] += 1
+                    stats['bytes_skipped'] += key.size
+                else:
+                    yield (key, full_path)
+        def download(bucket_res, item):
+            key, full_path = item
+            if not os.path.isdir(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path))
+            ## the listed time is read first, a GET on the listed key replaces it with the Last-Modified header
+            modified = get_modified_time(key.last_modified)
+            ## contents are kept as stored so that sizes and ETags compare with the listing
+            response = download_listed_file(bucket_res, key, os.path.dirname(full_path), multipart_threshold, part_size, max_workers, False)
+            if response['is_downloaded']:
+                os.utime(full_path, (modified, modified))
+            return (key.size, response)
+        try:
+            if not os.path.isdir(file_path):
+                os.makedirs(file_path)
+            for size, response in map_in_workers(bucket_res, download, changed_keys(), max_workers):
+                if response['is_downloaded']:
+                    stats['num_transferred'] += 1
+                    stats['bytes_transferred'] += size
+                else:
+                    errors.append('{0}: {1}'.format(response['key_name'], response['message']))
+            if delete and len(errors) == 0:
+                for full_path in unlisted:
+                    os.remove(full_path)
+                    stats['num_deleted'] += 1
+        except boto.exception.S3ResponseError as re:
+            errors.append('S3ResponseError = {0} {1} when listing keys'.format(re[0], re[1]))
+        except (IOError, OSError) as oe:
+            errors.append('{0} when syncing files'.format(oe))
+    else:
+        errors.append(res)
+    return get_sync_response(bucket_name, prefix, 'download', stats, errors)
+
+def sync_upload(conn_res, bucket_name, file_path, prefix = None, use_md5 = False, delete = False, max_workers = 1, multipart_threshold = None, part_size = DEFAULT_PART_SIZE):
+    stats = {'num_transferred': 0, 'bytes_transferred': 0, 'num_skipped': 0, 'bytes_skipped': 0, 'num_deleted': 0}
+    errors = []
+    sync_prefix = get_sync_prefix(prefix)
+    bucket_res = get_bucket_response(conn_res, bucket_name)
+    bucket_list, res = get_bucket_list_response(bucket_res, sync_prefix)
+    if not os.path.isdir(file_path):
+        errors.append('directory is not found')
+    elif bucket_list is not None:
+        try:
+            ## keys that have no local file, deleted once all files are uploaded
+            missing = []
+            def changed_files():
+                for rel_name, key, file_name in join_sync_names(get_bucket_list_pages((bucket_list, res)), sync_prefix, walk_key_names(file_path)):
+                    if file_name is None:
+                        missing.append(key.name)
+                    elif key is None or is_file_changed(os.path.join(file_path, *file_name.split('/')), key.size, key.last_modified, key.etag, use_md5, 'upload'):
+                        yield file_name
+                    else:
+                        stats['num_skipped'] += 1
+                        stats['bytes_skipped'] += key.size
+            def upload(bucket_res, file_name):
+                size = os.path.getsize(os.path.join(file_path, file_name))
+                key_name = sync_prefix + file_name
+                return (size, upload_to_bucket(bucket_res, file_path, file_name, None, multipart_threshold, part_size, max_workers, key_name))
+            for size, response in map_in_workers(bucket_res, upload, changed_files(), max_workers):
+                if response['is_uploaded']:
+                    stats['num_transferred'] += 1
+                    stats['bytes_transferred'] += size
+                else:
+                    errors.append('{0}: {1}'.format(response['file_name'], response['message']))
+            if delete and len(errors) == 0:
+                batches = [missing[i:i + DELETE_BATCH_SIZE] for i in range(0, len(missing), DELETE_BATCH_SIZE)]
+                for batch_listed, batch_deleted, batch_errors in map_in_workers(bucket_res, delete_key_batch, batches, max_workers):
+                    stats['num_deleted'] += batch_deleted
+                    errors.extend(['{0}: {1}'.format(error['key'], error['message']) for error in batch_errors])
+        except boto.exception.S3ResponseError as re:
+            errors.append('S3ResponseError = {0} {1} when syncing keys'.format(re[0], re[1]))
+        except (IOError, OSError) as oe:
+            errors.append('{0} when syncing files'.format(oe))
+    else:
+        errors.append(res)
+    return get_sync_response(bucket_name, prefix, 'upload', stats, errors)
+
+def copy_file(conn_res, src_bucket_name, src_key_name, dst_bucket_name, dst_key_name, validate = True):
+    src_bucket_res = get_bucket_response(conn_res, src_bucket_name, validate)
+    src_key, src_res = get_key_response(src_bucket_res, src_key_name, validate)
     if src_key is not None:
-        dst_bucket, dst_res = get_bucket_response(conn_res, dst_bucket_name)
+        dst_bucket, dst_res = get_bucket_response(conn_res, dst_bucket_name, validate)
         if dst_bucket is not None:
+            invalidate_cached_metadata(dst_bucket.connection.host, dst_bucket_name, dst_key_name)
             try:
-                src_key.copy(dst_bucket_name, dst_key_name, preserve_acl=True)
+                call_with_retry('copy', src_key.copy, dst_bucket_name, dst_key_name, preserve_acl=True, validate_dst_bucket=False)
                 response = {'src_key_name': src_key_name, 'is_copied': True, 'dst_key_name': dst_key_name, 'message': None}
             except boto.exception.S3ResponseError as re:
                 response = {'src_key_name': src_key_name, 'is_copied': False, 'dst_key_name': None, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
@@ -363,8 +1907,102 @@ def copy_file(conn_res, src_bucket_name, src_key_name, dst_bucket_name, dst_key_
         response = {'src_key_name': src_key_name, 'is_copied': False, 'dst_key_name': None, 'message': src_res}
     return response
 
-def generate_url(bucket_res, key_name, seconds):
-    key, res = get_key_response(bucket_res, key_name)
+## upload-part-copy of a key whose size is known, content_type and metadata are set as a single copy keeps them
+def copy_key_parts(dst_bucket_res, src_key, dst_key_name, part_size = DEFAULT_COPY_PART_SIZE, max_workers = 1, content_type = None, metadata = None):
+    dst_bucket, res = dst_bucket_res
+    src_bucket_name, src_key_name = src_key.bucket.name, src_key.name
+    headers = {'Content-Type': content_type} if content_type else None
+    parts = enumerate(get_byte_ranges(src_key.size, get_multipart_part_size(src_key.size, part_size)), 1)
+    mp = call_with_retry('multipart', dst_bucket.initiate_multipart_upload, dst_key_name, headers=headers, metadata=metadata)
+    def copy_part(bucket_res, part):
+        part_num, (start, end) = part
+        part_mp = MultiPartUpload(bucket_res[0])
+        part_mp.key_name, part_mp.id = mp.key_name, mp.id
+        try:
+            call_with_retry('copy', part_mp.copy_part_from_key, src_bucket_name, src_key_name, part_num, start, end)
+            message = None
+        except boto.exception.S3ResponseError as re:
+            message = 'part {0}: S3ResponseError = {1} {2}'.format(part_num, re[0], re[1])
+        except:
+            message = 'part {0}: Unhandled error occurred when copying part'.format(part_num)
+        return message
+    try:
+        errors = [message for message in map_in_workers(dst_bucket_res, copy_part, parts, max_workers) if message is not None]
+        if len(errors) == 0:
+            call_with_retry('multipart', mp.complete_upload)
+            message = None
+        else:
+            call_with_retry('multipart', mp.cancel_upload)
+            message = '{0} parts failed, multipart copy is aborted - {1}'.format(len(errors), errors[0])
+    except:
+        call_with_retry('multipart', mp.cancel_upload)
+        raise
+    return message
+
+## key is a listed key of the source bucket, the source handle is rebound to the connection of dst_bucket_res
+## the size comes from the listing, a copy in parts looks up only the content type and metadata that a listing lacks
+def copy_listed_key(dst_bucket_res, key, dst_key_name, multipart_threshold = None, part_size = DEFAULT_COPY_PART_SIZE, max_workers = 1, preserve_acl = False):
+    dst_bucket, res = dst_bucket_res
+    src_key = Key(dst_bucket.connection.get_bucket(key.bucket.name, validate=False), key.name)
+    src_key.size = key.size
+    multipart_threshold = min(multipart_threshold, MAX_COPY_SIZE + 1) if multipart_threshold is not None else MAX_COPY_SIZE + 1
+    invalidate_cached_metadata(dst_bucket.connection.host, dst_bucket.name, dst_key_name)
+    try:
+        if src_key.size >= max(multipart_threshold, 1):
+            head_key, head_res = get_key_response((src_key.bucket, None), src_key.name)
+            if head_key is not None:
+                message = copy_key_parts(dst_bucket_res, src_key, dst_key_name, part_size, max_workers, head_key.content_type, head_key.metadata)
+            else:
+                message = head_res
+            if message is None and preserve_acl:
+                acl = call_with_retry('acl', src_key.bucket.get_xml_acl, src_key.name)
+                call_with_retry('acl', dst_bucket.set_xml_acl, acl, dst_key_name)
+        else:
+            call_with_retry('copy', dst_bucket.copy_key, dst_key_name, src_key.bucket.name, src_key.name, preserve_acl=preserve_acl)
+            message = None
+        if message is None:
+            response = {'src_key_name': key.name, 'is_copied': True, 'dst_key_name': dst_key_name, 'message': None}
+        else:
+            response = {'src_key_name': key.name, 'is_copied': False, 'dst_key_name': None, 'message': message}
+    except boto.exception.S3ResponseError as re:
+        response = {'src_key_name': key.name, 'is_copied': False, 'dst_key_name': None, 'message': 'S3ResponseError = {0} {1}'.format(re[0], re[1])}
+    except:
+        response = {'src_key_name': key.name, 'is_copied': False, 'dst_key_name': None, 'message': 'Unhandled error occurred when copying key'}
+    return response
+
+## keys under prefix whose names match pattern are copied server-side, dst_prefix replaces prefix in their names
+## within a bucket, dst_prefix must differ from prefix and not be under it, or keys would be copied onto themselves
+## or listed and copied again
+def copy_files(conn_res, src_bucket_name, dst_bucket_name, prefix = None, dst_prefix = None, pattern = None, max_workers = 1, multipart_threshold = None, part_size = DEFAULT_COPY_PART_SIZE, preserve_acl = False):
+    if src_bucket_name == dst_bucket_name and (dst_prefix is None or dst_prefix.startswith(prefix or '')):
+        return [{'src_key_name': None, 'is_copied': False, 'dst_key_name': None, 'message': 'dst_prefix should differ from prefix and not be under it when copying within a bucket'}]
+    src_bucket_res = get_bucket_response(conn_res, src_bucket_name)
+    dst_bucket_res = get_bucket_response(conn_res, dst_bucket_name)
+    response = []
+    (bucket_list, res), key_filter = get_filtered_bucket_list_response(src_bucket_res, prefix, pattern)
+    if bucket_list is not None and dst_bucket_res[0] is not None:
+        def matched_keys():
+            for page in get_list_pages((bucket_list, res), key_filter=key_filter):
+                for key in page:
+                    yield key
+        def copy_key(bucket_res, key):
+            dst_key_name = dst_prefix + key.name[len(prefix or ''):] if dst_prefix is not None else key.name
+            return copy_listed_key(bucket_res, key, dst_key_name, multipart_threshold, part_size, max_workers, preserve_acl)
+        if key_filter is not None:
+            try:
+                response.extend(map_in_workers(dst_bucket_res, copy_key, matched_keys(), max_workers))
+                if len(response) == 0:
+                    res = 'key is not found'
+            except boto.exception.S3ResponseError as sre:
+                res = 'S3ResponseError = {0} {1} when listing keys'.format(sre[0], sre[1])
+        if len(response) == 0:
+            response.append({'src_key_name': None, 'is_copied': False, 'dst_key_name': None, 'message': res})
+    else:
+        response.append({'src_key_name': None, 'is_copied': False, 'dst_key_name': None, 'message': res if bucket_list is None else dst_bucket_res[1]})
+    return response
+
+def generate_url(bucket_res, key_name, seconds, validate = True):
+    key, res = get_key_response(bucket_res, key_name, validate)
     if key is not None:
         try:
             url = key.generate_url(seconds)
@@ -377,4 +2015,153 @@ def generate_url(bucket_res, key_name, seconds):
         response = {'key_name': key_name, 'has_url': False, 'url': None, 'message': res}
     return response
 
+def read_key_names(key_file):
+    instream = sys.stdin if key_file == '-' else open(key_file)
+    try:
+        key_names = [line.rstrip('\r\n') for line in instream if line.strip() != '']
+    finally:
+        if instream is not sys.stdin:
+            instream.close()
+    return key_names
+
+## urls are signed locally, S3 is contacted only to list a prefix or, with check_exists, to HEAD keys in parallel
+def generate_urls(conn_res, bucket_name, seconds, key_names = None, prefix = None, check_exists = False, max_workers = 1):
+    bucket_res = get_bucket_response(conn_res, bucket_name, validate = check_exists)
+    bucket, res = bucket_res
+    if bucket is not None:
+        def sign_url(bucket, key_name):
+            url = bucket.connection.generate_url(seconds, 'GET', bucket.name, key_name)
+            return {'key_name': key_name, 'has_url': True, 'url': url, 'message': None}
+        def sign(bucket_res, key_name):
+            bucket, res = bucket_res
+            key, res = get_key_response(bucket_res, key_name, validate = check_exists)
+            if key is not None:
+                response = sign_url(bucket, key_name)
+            else:
+                response = {'key_name': key_name, 'has_url': False, 'url': None, 'message': res}
+            return response
+        try:
+            if key_names is None:
+                ## listed keys exist, they are signed without a HEAD request each
+                bucket_list_res = get_bucket_list_response(bucket_res, prefix)
+                key_names = (key.name for page in get_bucket_list_pages(bucket_list_res) for key in page)
+                response = [sign_url(bucket, key_name) for key_name in key_names]
+            else:
+                response = list(map_in_workers(bucket_res, sign, key_names, max_workers if check_exists else 1))
+        except boto.exception.S3ResponseError as re:
+            response = [{'key_name': None, 'has_url': False, 'url': None, 'message': 'S3ResponseError = {0} {1} when listing keys'.format(re[0], re[1])}]
+    else:
+        response = [{'key_name': None, 'has_url': False, 'url': None, 'message': res}]
+    return response
+
+## each operation mirrors the composition of its inst/python script
+## arguments: (conn_res, bucket_res, args) where bucket_res is a function of bucket_name
+OPERATIONS = {
+    'lookup_location': lambda conn_res, bucket_res, args: lookup_location(),
+    'lookup_region': lambda conn_res, bucket_res, args: lookup_region(),
+    'lookup_bucket': lambda conn_res, bucket_res, args: lookup_bucket(conn_res, args['bucket_name']),
+    'lookup_key': lambda conn_res, bucket_res, args: lookup_key(bucket_res(args['bucket_name']), args['key_name']),
+    'get_all_buckets': lambda conn_res, bucket_res, args: get_all_buckets(conn_res),
+    'get_keys': lambda conn_res, bucket_res, args: get_filtered_keys(bucket_res(args['bucket_name']), args.get('prefix'), int(args.get('list_workers') or 1), args.get('shards'), args.get('pattern'), args.get('glob'), args.get('min_size'), args.get('max_size'), args.get('modified_since'), args.get('modified_before')),
+    'get_prefix_usage': lambda conn_res, bucket_res, args: get_prefix_usage(get_bucket_list_response(bucket_res(args['bucket_name']), args.get('prefix')), int(args.get('depth', 1)), args.get('delimiter') or '/', int(args.get('list_workers') or 1), args.get('shards')),
+    'index_keys': lambda conn_res, bucket_res, args: index_keys(get_bucket_list_response(bucket_res(args['bucket_name']), args.get('prefix')), args['index_path'], bool(args.get('incremental'))),
+    'query_key_index': lambda conn_res, bucket_res, args: query_key_index(args['index_path'], args['bucket_name'], args.get('prefix'), args.get('pattern'), args.get('min_size'), args.get('max_size'), args.get('modified_since')),
+    'get_access_control_list': lambda conn_res, bucket_res, args: get_access_control_list(conn_res, args['bucket_name'], args.get('key_name')),
+    'set_access_control_list': lambda conn_res, bucket_res, args: set_access_control_list(conn_res, args['bucket_name'], args['permission'], args.get('key_name')),
+    'set_access_control_lists': lambda conn_res, bucket_res, args: set_access_control_lists(conn_res, args['bucket_name'], args['permission'], args.get('prefix'), args.get('pattern'), int(args.get('max_workers') or 1), int(args.get('list_workers') or 1), args.get('shards')),
+    'audit_access_control_lists': lambda conn_res, bucket_res, args: audit_access_control_lists(conn_res, args['bucket_name'], args.get('prefix'), args.get('pattern'), int(args.get('max_workers') or 1), int(args.get('list_workers') or 1), args.get('shards')),
+    'create_bucket': lambda conn_res, bucket_res, args: create_bucket(conn_res, args['bucket_name'], args.get('location')),
+    'delete_bucket': lambda conn_res, bucket_res, args: delete_bucket(conn_res, args['bucket_name'], int(args.get('max_workers') or 1)),
+    'delete_keys': lambda conn_res, bucket_res, args: delete_keys(conn_res, args['bucket_name'], args.get('key_name'), args.get('prefix'), int(args.get('max_workers') or 1), int(args.get('list_workers') or 1), args.get('shards'), args.get('journal_path'), args.get('pattern'), args.get('glob'), args.get('min_size'), args.get('max_size'), args.get('modified_since'), args.get('modified_before')),
+    'download_files': lambda conn_res, bucket_res, args: download_files(conn_res, args['bucket_name'], args.get('file_path'), args.get('key_name'), args.get('pattern'), args.get('prefix'), int(args.get('max_workers') or 1), args.get('multipart_threshold'), int(args.get('part_size') or DEFAULT_PART_SIZE), int(args.get('list_workers') or 1), args.get('shards'), args.get('decompress') is not False, args.get('journal_path'), args.get('verify') is not False, args.get('glob'), args.get('min_size'), args.get('max_size'), args.get('modified_since'), args.get('modified_before')),
+    'upload_file': lambda conn_res, bucket_res, args: upload_file(conn_res, args['bucket_name'], args['file_path'], args['file_name'], args.get('prefix'), args.get('multipart_threshold'), int(args.get('part_size') or DEFAULT_PART_SIZE), int(args.get('max_workers') or 1), args.get('codec'), args.get('journal_path')),
+    'upload_files': lambda conn_res, bucket_res, args: upload_files(conn_res, args['bucket_name'], args['file_path'], args.get('prefix'), int(args.get('max_workers') or 1), args.get('multipart_threshold'), int(args.get('part_size') or DEFAULT_PART_SIZE), args.get('codec'), args.get('journal_path')),
+    'sync_download': lambda conn_res, bucket_res, args: sync_download(conn_res, args['bucket_name'], args['file_path'], args.get('prefix'), bool(args.get('use_md5')), bool(args.get('delete')), int(args.get('max_workers') or 1), args.get('multipart_threshold'), int(args.get('part_size') or DEFAULT_PART_SIZE)),
+    'sync_upload': lambda conn_res, bucket_res, args: sync_upload(conn_res, args['bucket_name'], args['file_path'], args.get('prefix'), bool(args.get('use_md5')), bool(args.get('delete')), int(args.get('max_workers') or 1), args.get('multipart_threshold'), int(args.get('part_size') or DEFAULT_PART_SIZE)),
+    'copy_file': lambda conn_res, bucket_res, args: copy_file(conn_res, args['src_bucket_name'], args['src_key_name'], args['dst_bucket_name'], args['dst_key_name'], args.get('validate') is not False),
+    'generate_urls': lambda conn_res, bucket_res, args: generate_urls(conn_res, args['bucket_name'], int(args['seconds']), args.get('key_names'), args.get('prefix'), bool(args.get('check_exists')), int(args.get('max_workers') or 1)),
+    'copy_files': lambda conn_res, bucket_res, args: copy_files(conn_res, args['src_bucket_name'], args['dst_bucket_name'], args.get('prefix'), args.get('dst_prefix'), args.get('pattern'), int(args.get('max_workers') or 1), args.get('multipart_threshold'), int(args.get('part_size') or DEFAULT_COPY_PART_SIZE), bool(args.get('preserve_acl'))),
+    'generate_url': lambda conn_res, bucket_res, args: generate_url(bucket_res(args['bucket_name']), args['key_name'], int(args['seconds']), args.get('validate') is not False)
+}
+
+def run_operation(conn_res, op, args):
+    args = args if isinstance(args, dict) else {}
+    if op in OPERATIONS:
+        try:
+            response = OPERATIONS[op](conn_res, lambda bucket_name: get_bucket_response(conn_res, bucket_name, args.get('validate') is not False), args)
+        except KeyError as ke:
+            response = {'op': op, 'message': 'missing argument: {0}'.format(ke.args[0])}
+        except (TypeError, ValueError) as ve:
+            response = {'op': op, 'message': 'invalid argument: {0}'.format(ve)}
+    else:
+        response = {'op': op, 'message': 'unknown operation'}
+    return response
+
+def parse_request(line):
+    try:
+        request = json.loads(line)
+        response = (request.get('op'), request.get('args'), None)
+    except (ValueError, AttributeError) as ve:
+        response = (None, None, {'op': None, 'message': 'invalid request: {0}'.format(ve)})
+    return response
+
+def serve_worker(conn_res, instream, outstream):
+    while True:
+        line = instream.readline()
+        if not line:
+            break
+        if line.strip() == '':
+            continue
+        op, args, response = parse_request(line)
+        if response is None:
+            if op == 'shutdown':
+                response = {'op': op, 'message': None}
+            else:
+                reset_metrics()
+                response = attach_metrics(run_operation(conn_res, op, args), op)
+        outstream.write(json.dumps(response, sort_keys=True, separators=(',', ':')) + '\n')
+        outstream.flush()
+        if op == 'shutdown':
+            break
+
+## manifest: one request per line as in serve_worker, results are written as
+## {'index': line number, 'op': op, 'response': response} in input or completion order
+def run_manifest(conn_res, instream, outstream, max_workers = 1, ordered = True):
+    conn, res = conn_res
+    local = threading.local()
+    def run(item):
+        index, line = item
+        if not hasattr(local, 'conn_res'):
+            local.conn_res = (clone_connection(conn), None) if conn is not None and max_workers > 1 else conn_res
+        op, args, response = parse_request(line)
+        if response is None:
+            response = run_operation(local.conn_res, op, args)
+        return {'index': index, 'op': op, 'response': response}
+    requests = ((index, line) for index, line in enumerate(instream, 1) if line.strip() != '')
+    cnt = 0
+    for result in map_in_threads(run, requests, max_workers, ordered):
+        outstream.write(json.dumps(result, sort_keys=True, separators=(',', ':')) + '\n')
+        outstream.flush()
+        cnt += 1
+    return cnt
+
+def serve_worker_socket(conn_res, port = 0, host = '127.0.0.1'):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(1)
+    ## the client reads the bound port from stdout before connecting
+    print(server.getsockname()[1])
+    sys.stdout.flush()
+    client, _ = server.accept()
+    server.close()
+    instream, outstream = client.makefile('r'), client.makefile('w')
+    try:
+        serve_worker(conn_res, instream, outstream)
+    finally:
+        instream.close()
+        outstream.close()
+        client.close()
 
+if os.environ.get('RS3HELPER_METRICS', '').lower() in ('1', 'true'):
+    enable_metrics(os.environ.get('RS3HELPER_TRACE') or None)
@@ -0,0 +1,20 @@
+## locations and regions of boto 2.49.0, precomputed so that they are looked up without importing boto
+## regenerate with get_boto_tables() when boto is upgraded
+
+## boto.s3.connection.Location constants
+LOCATIONS = ['APNortheast', 'APSoutheast', 'APSoutheast2', 'CNNorth1', 'DEFAULT', 'EU', 'EUCentral1', 'SAEast', 'USWest', 'USWest2']
+
+## names of boto.s3.regions()
+REGIONS = ['ap-northeast-1', 'ap-northeast-2', 'ap-south-1', 'ap-southeast-1', 'ap-southeast-2', 'ca-central-1', 'cn-north-1', 'eu-central-1', 'eu-west-1', 'eu-west-2', 'sa-east-1', 'us-east-1', 'us-east-2', 'us-gov-west-1', 'us-west-1', 'us-west-2']
+
+def lookup_location():
+    return list(LOCATIONS)
+
+def lookup_region():
+    return list(REGIONS)
+
+## tables of the installed boto, to check or regenerate the ones above
+def get_boto_tables():
+    import boto.s3
+    from boto.s3.connection import Location
+    return {'LOCATIONS': sorted(loc for loc in dir(Location) if loc[0].isupper()), 'REGIONS': sorted(str(rgn.name) for rgn in boto.s3.regions())}
@@ -1,7 +1,7 @@
 import json
 import argparse
 
-from s3helper import get_connection_response, set_access_control_list
+from s3helper import get_connection_response, set_access_control_list, attach_metrics
 
 parser = argparse.ArgumentParser(description='set canned access control policy to a bucket or key')
 parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
@@ -17,4 +17,5 @@ args = parser.parse_args()
 conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
 response = set_access_control_list(conn_res, args.bucket_name, args.permission, args.key_name)
 
+response = attach_metrics(response, 'set_access_control_list')
 print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
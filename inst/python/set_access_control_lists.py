@@ -0,0 +1,25 @@
+import json
+import argparse
+
+from s3helper import get_connection_response, set_access_control_lists, attach_metrics
+
+parser = argparse.ArgumentParser(description='set canned access control policy to keys under a prefix')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--permission', required=True, type=str, help='Canned permission')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--pattern', required=False, type=str, help='Regular expression that filters key names')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent ACL requests')
+parser.add_argument('--list_workers', required=False, type=int, default=1, help='Number of concurrent listing requests over prefix shards')
+parser.add_argument('--shards', required=False, type=str, nargs='*', help='Key names that split the listing into shards')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+response = set_access_control_lists(conn_res, args.bucket_name, args.permission, args.prefix, args.pattern, args.max_workers, args.list_workers, args.shards)
+
+response = attach_metrics(response, 'set_access_control_lists')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
@@ -0,0 +1,32 @@
+import sys
+import json
+import argparse
+
+from s3helper import get_connection_response, get_bucket_response, get_key_response, stream_key, attach_metrics, metrics
+
+parser = argparse.ArgumentParser(description='write key contents to stdout')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--key_name', required=True, type=str, help='S3 key name')
+parser.add_argument('--decompress', required=False, type=bool, help='Decompress gzip or zlib contents?')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+## stdout carries the contents only, the response goes to stderr if streaming fails or metrics are enabled
+outstream = getattr(sys.stdout, 'buffer', sys.stdout)
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+bucket_res = get_bucket_response(conn_res, args.bucket_name)
+key_res = get_key_response(bucket_res, args.key_name)
+response = stream_key(key_res, args.key_name, outstream.write, bool(args.decompress))
+outstream.flush()
+
+is_streamed = response['is_streamed']
+if not is_streamed or metrics is not None:
+    response = attach_metrics(response, 'stream_key')
+    sys.stderr.write(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')) + '\n')
+if not is_streamed:
+    sys.exit(1)
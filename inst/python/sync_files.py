@@ -0,0 +1,28 @@
+import json
+import argparse
+
+from s3helper import get_connection_response, sync_download, sync_upload, DEFAULT_PART_SIZE, attach_metrics
+
+parser = argparse.ArgumentParser(description='sync files between a directory and a prefix')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--file_path', required=True, type=str, help='Directory path')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--direction', required=False, type=str, default='download', choices=['download', 'upload'], help='Sync direction')
+parser.add_argument('--use_md5', required=False, type=bool, help='Compare files by MD5?')
+parser.add_argument('--delete', required=False, type=bool, help='Delete files missing on the other side?')
+parser.add_argument('--multipart_threshold', required=False, type=int, help='Size in bytes from which a file is transferred in parts')
+parser.add_argument('--part_size', required=False, type=int, default=DEFAULT_PART_SIZE, help='Size of a part in bytes')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent transfers')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+sync = sync_upload if args.direction == 'upload' else sync_download
+response = sync(conn_res, args.bucket_name, args.file_path, args.prefix, bool(args.use_md5), bool(args.delete), args.max_workers, args.multipart_threshold, args.part_size)
+
+response = attach_metrics(response, 'sync_files')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
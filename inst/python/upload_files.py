@@ -0,0 +1,26 @@
+import json
+import argparse
+
+from s3helper import get_connection_response, upload_files, DEFAULT_PART_SIZE, CODECS, attach_metrics
+
+parser = argparse.ArgumentParser(description='upload files in a directory')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--bucket_name', required=True, type=str, help='S3 bucket name')
+parser.add_argument('--file_path', required=True, type=str, help='Directory path')
+parser.add_argument('--prefix', required=False, type=str, help='S3 prefix')
+parser.add_argument('--multipart_threshold', required=False, type=int, help='Size in bytes from which a file is uploaded in parts')
+parser.add_argument('--part_size', required=False, type=int, default=DEFAULT_PART_SIZE, help='Size of a part in bytes')
+parser.add_argument('--max_workers', required=False, type=int, default=1, help='Number of concurrent uploads')
+parser.add_argument('--codec', required=False, type=str, choices=CODECS, help='Content-Encoding by which contents are compressed')
+parser.add_argument('--journal_path', required=False, type=str, help='Journal file of the upload, resumed if it exists')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+response = upload_files(conn_res, args.bucket_name, args.file_path, args.prefix, args.max_workers, args.multipart_threshold, args.part_size, args.codec, args.journal_path)
+
+response = attach_metrics(response, 'upload_files')
+print(json.dumps(response, sort_keys=True, indent=4, separators=(',', ': ')))
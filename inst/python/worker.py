@@ -0,0 +1,20 @@
+import sys
+import argparse
+
+from s3helper import get_connection_response, serve_worker, serve_worker_socket
+
+parser = argparse.ArgumentParser(description='serve requests on a persistent connection')
+parser.add_argument('--access_key_id', required=True, type=str, help='AWS access key id')
+parser.add_argument('--secret_access_key', required=True, type=str, help='AWS secret access key')
+parser.add_argument('--port', required=False, type=int, help='Local port to listen on, 0 for any free port - stdin/stdout if omitted')
+parser.add_argument('--is_ordinary_calling_format', required=False, type=bool, help='Connected in ordinary calling format?')
+parser.add_argument('--region', required=False, type=str, help='Region info')
+
+args = parser.parse_args()
+
+conn_res = get_connection_response(args.access_key_id, args.secret_access_key, args.is_ordinary_calling_format, args.region)
+
+if args.port is not None:
+    serve_worker_socket(conn_res, args.port)
+else:
+    serve_worker(conn_res, sys.stdin, sys.stdout)
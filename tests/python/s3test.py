@@ -0,0 +1,85 @@
+## tests run against a local S3-compatible server (eg moto server) and are skipped if it is not running
+##
+##   moto_server -p 5000 &
+##   python -m unittest discover -s tests/python
+##
+## S3HELPER_TEST_HOST and S3HELPER_TEST_PORT point the tests to another server
+import email.utils
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'inst', 'python'))
+
+import s3helper
+
+HOST = os.environ.get('S3HELPER_TEST_HOST', 'localhost')
+PORT = int(os.environ.get('S3HELPER_TEST_PORT', '5000'))
+
+def is_server_running():
+    try:
+        socket.create_connection((HOST, PORT), 1).close()
+        return True
+    except socket.error:
+        return False
+
+def get_connection_response():
+    return s3helper.get_connection_response('test-access-key', 'test-secret-key', True, None, HOST, PORT, False)
+
+## seconds since the epoch of a Last-Modified header
+def get_modified_time(last_modified):
+    return email.utils.mktime_tz(email.utils.parsedate_tz(last_modified))
+
+## functions of a module or class are replaced for the duration of a test
+def patch(test, owner, name, value):
+    original = getattr(owner, name)
+    setattr(owner, name, value)
+    test.addCleanup(setattr, owner, name, original)
+    return original
+
+## each test gets a new bucket and a temporary directory, both removed after it - S3 calls of the fixtures
+## are retried like those of s3helper as a local server can fail a request now and then
+class S3TestCase(unittest.TestCase):
+    def setUp(self):
+        if not is_server_running():
+            self.skipTest('S3 server is not running at {0}:{1}'.format(HOST, PORT))
+        self.conn_res = get_connection_response()
+        self.bucket_name = 'rs3helper-test-' + uuid.uuid4().hex[:12]
+        self.bucket = s3helper.call_with_retry('create', self.conn_res[0].create_bucket, self.bucket_name)
+        self.tmp_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_path, True)
+        self.addCleanup(self.remove_bucket)
+
+    def remove_bucket(self):
+        for upload in self.bucket.list_multipart_uploads():
+            s3helper.call_with_retry('multipart', upload.cancel_upload)
+        for key in self.bucket.list():
+            s3helper.call_with_retry('delete', self.bucket.delete_key, key.name)
+        s3helper.call_with_retry('delete', self.bucket.delete)
+
+    def put(self, key_name, data, headers = None):
+        key = self.bucket.new_key(key_name)
+        s3helper.call_with_retry('upload', key.set_contents_from_string, data, headers)
+        return key
+
+    def get_bucket_response(self):
+        return s3helper.get_bucket_response(self.conn_res, self.bucket_name)
+
+    def get_key_response(self, key_name):
+        return s3helper.get_key_response(self.get_bucket_response(), key_name)
+
+    def write_file(self, file_name, data):
+        full_path = os.path.join(self.tmp_path, file_name)
+        if not os.path.isdir(os.path.dirname(full_path)):
+            os.makedirs(os.path.dirname(full_path))
+        with open(full_path, 'wb') as f:
+            f.write(data)
+        return full_path
+
+    def read_file(self, full_path):
+        with open(full_path, 'rb') as f:
+            return f.read()
@@ -0,0 +1,54 @@
+import gzip
+import io
+import os
+import unittest
+
+from s3test import S3TestCase, get_modified_time, s3helper
+
+def gzip_data(data):
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj = buf, mode = 'wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+## the modification time of a downloaded file is the Last-Modified of its key unless its contents are decoded
+class ModifiedTimeTest(S3TestCase):
+    def test_download(self):
+        self.put('plain.txt', b'hello')
+        key_res = self.get_key_response('plain.txt')
+        response = s3helper.download_file(key_res, 'plain.txt', self.tmp_path)
+        self.assertTrue(response['is_downloaded'])
+        self.assertEqual(os.path.getmtime(os.path.join(self.tmp_path, 'plain.txt')), get_modified_time(key_res[0].last_modified))
+
+    def test_download_without_decompress(self):
+        self.put('plain.txt', b'hello')
+        key_res = self.get_key_response('plain.txt')
+        response = s3helper.download_file(key_res, 'plain.txt', self.tmp_path, decompress = False)
+        self.assertTrue(response['is_downloaded'])
+        self.assertEqual(os.path.getmtime(os.path.join(self.tmp_path, 'plain.txt')), get_modified_time(key_res[0].last_modified))
+
+    def test_download_decoded(self):
+        self.put('encoded.txt', gzip_data(b'hello'), {'Content-Encoding': 'gzip'})
+        response = s3helper.download_file(self.get_key_response('encoded.txt'), 'encoded.txt', self.tmp_path)
+        self.assertTrue(response['is_downloaded'])
+        self.assertEqual(self.read_file(os.path.join(self.tmp_path, 'encoded.txt')), b'hello')
+
+class StreamKeyTest(S3TestCase):
+    def stream(self, key_name, decompress):
+        out = io.BytesIO()
+        response = s3helper.stream_key(self.get_key_response(key_name), key_name, out.write, decompress)
+        return (response, out.getvalue())
+
+    def test_plain_key_with_decompress(self):
+        self.put('plain.txt', b'hello plain')
+        response, data = self.stream('plain.txt', True)
+        self.assertTrue(response['is_streamed'])
+        self.assertEqual(data, b'hello plain')
+
+    def test_encoded_key(self):
+        self.put('encoded.txt', gzip_data(b'hello encoded'), {'Content-Encoding': 'gzip'})
+        self.assertEqual(self.stream('encoded.txt', True)[1], b'hello encoded')
+        self.assertEqual(self.stream('encoded.txt', False)[1], gzip_data(b'hello encoded'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+import boto.s3.bucket
+
+from s3test import S3TestCase, patch, s3helper
+
+KEY_NAMES = ['logs/a.txt', 'logs/b.csv', 'logs/c/d.txt', 'other.txt']
+
+class CopyFilesTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        for key_name in KEY_NAMES:
+            self.put(key_name, key_name.encode('utf-8'))
+
+    def get_key_names(self, bucket):
+        return sorted(key.name for key in bucket.list())
+
+    def remove_dst_bucket(self, bucket):
+        for key in bucket.list():
+            s3helper.call_with_retry('delete', bucket.delete_key, key.name)
+        s3helper.call_with_retry('delete', bucket.delete)
+
+    def count_get_key(self):
+        calls = []
+        get_key = patch(self, boto.s3.bucket.Bucket, 'get_key', lambda bucket, *args, **kwargs: calls.append(args[0]) or get_key(bucket, *args, **kwargs))
+        return calls
+
+    def copy(self, dst_bucket_name, **kwargs):
+        response = s3helper.copy_files(self.conn_res, self.bucket_name, dst_bucket_name, **kwargs)
+        self.assertTrue(all(result['is_copied'] for result in response), response)
+        return sorted((result['src_key_name'], result['dst_key_name']) for result in response)
+
+    ## a listed key is copied without a HEAD request of its own
+    def test_copy_within_bucket(self):
+        calls = self.count_get_key()
+        self.assertEqual(self.copy(self.bucket_name, prefix = 'logs/', dst_prefix = 'archive/', max_workers = 2), [
+            ('logs/a.txt', 'archive/a.txt'), ('logs/b.csv', 'archive/b.csv'), ('logs/c/d.txt', 'archive/c/d.txt')])
+        self.assertEqual(calls, [])
+        self.assertEqual(self.bucket.get_key('archive/c/d.txt').get_contents_as_string(), b'logs/c/d.txt')
+
+    def test_copy_pattern(self):
+        self.assertEqual(self.copy(self.bucket_name, prefix = 'logs/', dst_prefix = 'archive/', pattern = r'\.txt$'), [
+            ('logs/a.txt', 'archive/a.txt'), ('logs/c/d.txt', 'archive/c/d.txt')])
+
+    def test_copy_between_buckets(self):
+        dst_bucket = s3helper.call_with_retry('create', self.conn_res[0].create_bucket, self.bucket_name + '-dst')
+        self.addCleanup(self.remove_dst_bucket, dst_bucket)
+        self.copy(dst_bucket.name, prefix = 'logs/')
+        self.assertEqual(self.get_key_names(dst_bucket), KEY_NAMES[:3])
+
+    ## within a bucket, keys would be copied onto themselves or listed and copied again
+    def test_reject_same_keys(self):
+        for prefix, dst_prefix in [('logs/', None), (None, None), ('logs/', 'logs/'), ('logs/', 'logs/copy/'), (None, 'copy/')]:
+            response = s3helper.copy_files(self.conn_res, self.bucket_name, self.bucket_name, prefix = prefix, dst_prefix = dst_prefix)
+            self.assertEqual(len(response), 1)
+            self.assertFalse(response[0]['is_copied'])
+            self.assertIsNone(response[0]['src_key_name'])
+        self.assertEqual(self.get_key_names(self.bucket), KEY_NAMES)
+
+    ## the content type and metadata that a listing lacks are looked up for a copy in parts
+    def test_copy_parts(self):
+        data = b'x' * (6 * 1024 * 1024)
+        key = self.bucket.new_key('big/data.bin')
+        key.set_metadata('origin', 'test')
+        s3helper.call_with_retry('upload', key.set_contents_from_string, data, {'Content-Type': 'application/x-test'})
+        calls = self.count_get_key()
+        self.assertEqual(self.copy(self.bucket_name, prefix = 'big/', dst_prefix = 'copy/', multipart_threshold = 1024, part_size = 5 * 1024 * 1024, max_workers = 2), [('big/data.bin', 'copy/data.bin')])
+        self.assertEqual(calls, ['big/data.bin'])
+        copied = self.bucket.get_key('copy/data.bin')
+        self.assertEqual((copied.size, copied.content_type, copied.get_metadata('origin')), (len(data), 'application/x-test', 'test'))
+        self.assertEqual(copied.get_contents_as_string(), data)
+
+if __name__ == '__main__':
+    unittest.main()
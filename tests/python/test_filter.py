@@ -0,0 +1,30 @@
+import unittest
+
+from s3test import S3TestCase, s3helper
+
+class FilteredListingTest(S3TestCase):
+    def test_literal_prefix_of_filter(self):
+        self.put('data/a.csv', b'a')
+        self.put('logs/b.csv', b'b')
+        bucket_list_res, key_filter = s3helper.get_filtered_bucket_list_response(self.get_bucket_response(), None, glob = 'logs/*.csv')
+        self.assertEqual(bucket_list_res[0].prefix, 'logs/')
+        names = [key.name for page in s3helper.get_list_pages(bucket_list_res, key_filter = key_filter) for key in page]
+        self.assertEqual(names, ['logs/b.csv'])
+
+    def test_invalid_pattern(self):
+        bucket_list_res, key_filter = s3helper.get_filtered_bucket_list_response(self.get_bucket_response(), None, pattern = '(')
+        self.assertIsNone(bucket_list_res[0])
+        self.assertIsNone(key_filter)
+
+    ## an empty listing narrowed by the filter does not mean that the bucket is empty
+    def test_download_narrowed_listing(self):
+        self.put('data/a.csv', b'a')
+        response = s3helper.download_files(self.conn_res, self.bucket_name, self.tmp_path, glob = 'logs/*.csv')
+        self.assertEqual([result['message'] for result in response], ['key is not found'])
+
+    def test_download_empty_bucket(self):
+        response = s3helper.download_files(self.conn_res, self.bucket_name, self.tmp_path)
+        self.assertEqual([result['message'] for result in response], ['there is no key in the bucket'])
+
+if __name__ == '__main__':
+    unittest.main()
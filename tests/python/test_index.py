@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import os
+import sqlite3
+import sys
+import unittest
+
+from s3test import S3TestCase, s3helper
+
+KEY_NAMES = [u'a/1', u'a/2', u'a0', u'ab/x', u'a\xe9/z', u'b/1']
+
+class PrefixBoundTest(unittest.TestCase):
+    def test_bound(self):
+        self.assertEqual(s3helper.get_prefix_bound(u'a/'), u'a0')
+        self.assertEqual(s3helper.get_prefix_bound(u'a\xe9'), u'a\xea')
+
+    def test_bound_skips_surrogates(self):
+        self.assertEqual(s3helper.get_prefix_bound(u'a' + s3helper.unichr(0xD7FF)), u'a' + s3helper.unichr(0xE000))
+
+    def test_bound_of_last_code_point(self):
+        self.assertEqual(s3helper.get_prefix_bound(u'a' + s3helper.unichr(sys.maxunicode)), u'b')
+        self.assertIsNone(s3helper.get_prefix_bound(s3helper.unichr(sys.maxunicode)))
+        self.assertIsNone(s3helper.get_prefix_bound(u''))
+
+class KeyIndexTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        for key_name in KEY_NAMES:
+            self.put(key_name.encode('utf-8'), b'x')
+        self.index_path = os.path.join(self.tmp_path, 'keys.db')
+
+    def index(self, prefix, incremental = False):
+        bucket_list_res = s3helper.get_bucket_list_response(self.get_bucket_response(), prefix)
+        return s3helper.index_keys(bucket_list_res, self.index_path, incremental)
+
+    def query(self, prefix):
+        return [result['key_name'] for result in s3helper.query_key_index(self.index_path, self.bucket_name, prefix)]
+
+    def test_query_prefix(self):
+        self.assertEqual(self.index('')['num_keys'], len(KEY_NAMES))
+        self.assertEqual(self.query('a/'), [u'a/1', u'a/2'])
+        self.assertEqual(self.query('a'), KEY_NAMES[:5])
+        self.assertEqual(self.query(u'a\xe9'.encode('utf-8')), [u'a\xe9/z'])
+        self.assertEqual(self.query(''), KEY_NAMES)
+
+    ## a full index of a prefix replaces the keys under it only
+    def test_index_prefix(self):
+        self.index('')
+        s3helper.call_with_retry('delete', self.bucket.delete_key, 'a/1')
+        self.assertEqual(self.index('a/')['num_keys'], 1)
+        self.assertEqual(self.query(''), KEY_NAMES[1:])
+
+    ## an incremental index lists only after the last indexed key under the prefix
+    def test_incremental_index(self):
+        self.index('')
+        self.put('a/3', b'x')
+        self.assertEqual(self.index('a/', True)['num_keys'], 1)
+        self.assertEqual(self.query('a/'), [u'a/1', u'a/2', u'a/3'])
+
+    def test_prefix_uses_primary_key(self):
+        self.index('')
+        clause, args = s3helper.get_prefix_clause('a/')
+        index = sqlite3.connect(self.index_path)
+        try:
+            plan = index.execute('EXPLAIN QUERY PLAN SELECT key_name FROM keys WHERE bucket_name = ? AND ' + clause, [self.bucket_name] + args).fetchall()
+        finally:
+            index.close()
+        self.assertIn('key_name>?', ' '.join(str(row[-1]) for row in plan))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import boto
+from boto.s3.multipart import MultiPartUpload
+
+from s3test import S3TestCase, patch, s3helper
+
+MB = 1024 * 1024
+KEY_NAMES = ['d/k{0:02d}'.format(index) for index in range(30)]
+
+class JournalFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_path, True)
+        self.journal_path = os.path.join(self.tmp_path, 'job.journal')
+
+    def write_lines(self, lines):
+        with open(self.journal_path, 'w') as f:
+            f.write(''.join(lines))
+
+    ## a record that is cut short by a crash ends the journal
+    def test_partial_record(self):
+        self.write_lines([json.dumps({'op': 'job'}) + '\n', json.dumps({'marker': 'b'}) + '\n', json.dumps({'done': 'd'}) + '\n', '{"done": "e'])
+        journal = s3helper.open_journal(self.journal_path, {'op': 'job'})
+        s3helper.close_journal(journal)
+        self.assertEqual(journal['marker'], 'b')
+        self.assertEqual(journal['done'], set(['d']))
+        self.assertTrue(s3helper.is_journaled(journal, 'a'))
+        self.assertFalse(s3helper.is_journaled(journal, 'c'))
+
+    def test_journal_of_another_job(self):
+        self.write_lines([json.dumps({'op': 'job'}) + '\n', json.dumps({'marker': 'b'}) + '\n'])
+        journal = s3helper.open_journal(self.journal_path, {'op': 'other job'})
+        s3helper.close_journal(journal)
+        self.assertIsNone(journal['marker'])
+        with open(self.journal_path) as f:
+            self.assertEqual(f.read(), json.dumps({'op': 'other job'}) + '\n')
+
+    ## the marker stops at the first failure, later items are recorded one by one
+    def test_marker_stops_at_failure(self):
+        journal = s3helper.open_journal(self.journal_path, {'op': 'job'})
+        for name, is_done in [('a', True), ('b', False), ('c', True)]:
+            s3helper.record_journal(journal, name, is_done)
+        s3helper.close_journal(journal, True)
+        journal = s3helper.open_journal(self.journal_path, {'op': 'job'})
+        s3helper.close_journal(journal)
+        self.assertEqual([s3helper.is_journaled(journal, name) for name in ['a', 'b', 'c']], [True, False, True])
+
+class ResumeDownloadTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        for key_name in KEY_NAMES:
+            self.put(key_name, b'x')
+        self.journal_path = os.path.join(self.tmp_path, 'job.journal')
+        self.file_path = os.path.join(self.tmp_path, 'files')
+        os.makedirs(self.file_path)
+        self.downloaded = []
+        self.is_interrupted = True
+        self.original = patch(self, s3helper, 'download_listed_file', self.download_listed_file)
+
+    ## d/k10 fails and the first run is interrupted at d/k20
+    def download_listed_file(self, bucket_res, key, *args):
+        self.downloaded.append(key.name)
+        if key.name == 'd/k10':
+            return {'key_name': key.name, 'is_downloaded': False, 'file_path': None, 'file_name': None, 'message': 'failed'}
+        if key.name == 'd/k20' and self.is_interrupted:
+            raise KeyboardInterrupt()
+        return self.original(bucket_res, key, *args)
+
+    def resume(self, list_workers = 1, shards = None):
+        with self.assertRaises(KeyboardInterrupt):
+            s3helper.download_files(self.conn_res, self.bucket_name, self.file_path, prefix = 'd/', journal_path = self.journal_path, list_workers = list_workers, shards = shards)
+        self.downloaded, self.is_interrupted = [], False
+        response = s3helper.download_files(self.conn_res, self.bucket_name, self.file_path, prefix = 'd/', journal_path = self.journal_path, list_workers = list_workers, shards = shards)
+        return (response, self.downloaded)
+
+    def test_resume(self):
+        response, downloaded = self.resume()
+        self.assertEqual(downloaded, ['d/k10'] + KEY_NAMES[20:])
+        self.assertEqual([result['key_name'] for result in response if not result['is_downloaded']], ['d/k10'])
+        self.assertTrue(os.path.isfile(self.journal_path))
+
+    def test_resume_sharded(self):
+        response, downloaded = self.resume(2, ['d/k05', 'd/k15', 'd/k25'])
+        self.assertEqual(downloaded, ['d/k10'] + KEY_NAMES[20:])
+
+    def test_resume_discovered_shards(self):
+        response, downloaded = self.resume(2)
+        self.assertEqual(downloaded, ['d/k10'] + KEY_NAMES[20:])
+
+    def test_journal_is_removed(self):
+        self.is_interrupted = False
+        patch(self, s3helper, 'download_listed_file', self.original)
+        response = s3helper.download_files(self.conn_res, self.bucket_name, self.file_path, prefix = 'd/', journal_path = self.journal_path)
+        self.assertEqual(len(response), len(KEY_NAMES))
+        self.assertFalse(os.path.exists(self.journal_path))
+
+class ResumeUploadTest(S3TestCase):
+    ## parts uploaded by the interrupted run are listed from S3 and only the missing part is uploaded again
+    def test_resume_multipart_upload(self):
+        data = os.urandom(12 * MB)
+        self.write_file(os.path.join('files', 'big.bin'), data)
+        self.write_file(os.path.join('files', 'small.txt'), b'small')
+        journal_path = os.path.join(self.tmp_path, 'job.journal')
+        part_nums = []
+        def upload_part_from_file(mp, fp, part_num, *args, **kwargs):
+            part_nums.append(part_num)
+            if part_num == 3 and is_failing[0]:
+                raise boto.exception.S3ResponseError(400, 'Bad Request')
+            return original(mp, fp, part_num, *args, **kwargs)
+        original = patch(self, MultiPartUpload, 'upload_part_from_file', upload_part_from_file)
+        is_failing = [True]
+        upload = lambda: s3helper.upload_files(self.conn_res, self.bucket_name, os.path.join(self.tmp_path, 'files'), 'up', multipart_threshold = 5 * MB, part_size = 5 * MB, journal_path = journal_path)
+        response = upload()
+        self.assertEqual(sorted((result['file_name'], result['is_uploaded']) for result in response), [('big.bin', False), ('small.txt', True)])
+        self.assertEqual(len(list(self.bucket.list_multipart_uploads())), 1)
+        part_nums[:], is_failing[0] = [], False
+        response = upload()
+        self.assertEqual([(result['file_name'], result['is_uploaded']) for result in response], [('big.bin', True)])
+        self.assertEqual(part_nums, [3])
+        self.assertEqual(self.bucket.get_key(response[0]['key_name']).get_contents_as_string(), data)
+        self.assertEqual(len(list(self.bucket.list_multipart_uploads())), 0)
+        self.assertFalse(os.path.exists(journal_path))
+
+if __name__ == '__main__':
+    unittest.main()
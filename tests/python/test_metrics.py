@@ -0,0 +1,47 @@
+import io
+import json
+import os
+import unittest
+
+from s3test import S3TestCase, patch, s3helper
+
+class MetricsTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        patch(self, s3helper, 'metrics', None)
+        self.trace_path = os.path.join(self.tmp_path, 'trace.ndjson')
+        s3helper.enable_metrics(self.trace_path)
+
+    def read_trace(self):
+        with open(self.trace_path) as f:
+            return [json.loads(line) for line in f]
+
+    ## a call is counted under the phase given to call_with_retry, whatever its function is named
+    def test_call_phase(self):
+        self.put('a.txt', b'a')
+        s3helper.reset_metrics()
+        s3helper.call_with_retry('download', lambda: self.bucket.get_key('a.txt').get_contents_as_string())
+        self.assertEqual(s3helper.get_metrics_summary()['calls'], {'download': 1})
+        record = self.read_trace()[-1]
+        self.assertEqual((record['event'], record['phase']), ('call', 'download'))
+
+    ## streamed keys keep their format, the summary of the run goes to the trace
+    def test_streamed_summary(self):
+        self.put('a.txt', b'a')
+        bucket_list_res = s3helper.get_bucket_list_response(self.get_bucket_response())
+        s3helper.reset_metrics()
+        outstream = io.BytesIO()
+        s3helper.stream_keys(bucket_list_res, outstream)
+        s3helper.write_metrics_summary('get_keys')
+        self.assertEqual(json.loads(outstream.getvalue().decode('utf-8'))['key_name'], 'a.txt')
+        summaries = [record for record in self.read_trace() if record['event'] == 'summary']
+        self.assertEqual([summary['op'] for summary in summaries], ['get_keys'])
+        self.assertEqual(summaries[0]['calls'], {'list': 1})
+
+    def test_disabled(self):
+        patch(self, s3helper, 'metrics', None)
+        self.assertIsNone(s3helper.write_metrics_summary('get_keys'))
+        self.assertEqual(s3helper.attach_metrics({'message': None}), {'message': None})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import unittest
+
+import boto
+from boto.s3.key import Key
+
+from s3test import S3TestCase, get_modified_time, patch, s3helper
+
+class DownloadRangesTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        self.data = os.urandom(300000)
+        self.put('big.bin', self.data)
+        self.full_path = os.path.join(self.tmp_path, 'big.bin')
+
+    def download(self):
+        return s3helper.download_file(self.get_key_response('big.bin'), 'big.bin', self.tmp_path, multipart_threshold = 1, part_size = 100000, max_workers = 2)
+
+    def test_download_ranges(self):
+        response = self.download()
+        self.assertTrue(response['is_downloaded'])
+        self.assertEqual(self.read_file(self.full_path), self.data)
+        self.assertFalse(os.path.exists(self.full_path + '.parts'))
+        self.assertEqual(os.path.getmtime(self.full_path), get_modified_time(self.get_key_response('big.bin')[0].last_modified))
+
+    ## ranges that are downloaded are kept in the progress file and a later download gets the others only
+    def test_resume(self):
+        ranges = []
+        def get_file(key, fp, headers = None, *args, **kwargs):
+            ranges.append(headers['Range'])
+            if headers['Range'] == 'bytes=100000-199999' and is_failing[0]:
+                raise boto.exception.S3ResponseError(403, 'Forbidden')
+            return original(key, fp, headers, *args, **kwargs)
+        original = patch(self, Key, 'get_file', get_file)
+        is_failing = [True]
+        response = self.download()
+        self.assertFalse(response['is_downloaded'])
+        self.assertTrue(os.path.isfile(self.full_path + '.parts'))
+        ranges[:], is_failing[0] = [], False
+        response = self.download()
+        self.assertTrue(response['is_downloaded'])
+        self.assertEqual(ranges, ['bytes=100000-199999'])
+        self.assertEqual(self.read_file(self.full_path), self.data)
+
+if __name__ == '__main__':
+    unittest.main()
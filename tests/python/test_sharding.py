@@ -0,0 +1,45 @@
+import unittest
+
+from s3test import S3TestCase, s3helper
+
+KEY_NAMES = ['d/k{0:02d}'.format(index) for index in range(30)]
+
+class ShardedListingTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        for key_name in KEY_NAMES:
+            self.put(key_name, b'x')
+
+    def list_names(self, prefix = 'd/', marker = None, list_workers = 2, boundaries = None):
+        bucket_list, res = s3helper.get_bucket_list_response(self.get_bucket_response(), prefix)
+        if marker is not None:
+            bucket_list.marker = marker
+        return [key.name for page in s3helper.get_list_pages((bucket_list, res), list_workers, boundaries) for key in page]
+
+    ## a boundary that is a key name ends its shard, the next shard starts after it
+    def test_boundaries_on_keys(self):
+        self.assertEqual(self.list_names(boundaries = ['d/k10', 'd/k20']), KEY_NAMES)
+
+    def test_boundaries_between_keys(self):
+        self.assertEqual(self.list_names(boundaries = ['d/k10a', 'd/k15a']), KEY_NAMES)
+
+    def test_unsorted_and_repeated_boundaries(self):
+        self.assertEqual(self.list_names(boundaries = ['d/k20', 'd/k05', 'd/k20', 'd/k05']), KEY_NAMES)
+
+    def test_boundaries_outside_prefix(self):
+        self.assertEqual(self.list_names(boundaries = ['a', 'd/k00', 'z']), KEY_NAMES)
+
+    def test_boundaries_after_marker(self):
+        self.assertEqual(self.list_names(marker = 'd/k15', boundaries = ['d/k10', 'd/k20']), KEY_NAMES[16:])
+
+    def test_discovered_shards(self):
+        for key_name in ['d/a/1', 'd/a/2', 'd/b/1', 'd/z/1']:
+            self.put(key_name, b'x')
+        names = self.list_names(list_workers = 3)
+        self.assertEqual(names, sorted(KEY_NAMES + ['d/a/1', 'd/a/2', 'd/b/1', 'd/z/1']))
+
+    def test_sequential_listing_after_marker(self):
+        self.assertEqual(self.list_names(marker = 'd/k15', list_workers = 1), KEY_NAMES[16:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import time
+import unittest
+
+from s3test import S3TestCase, s3helper
+
+## names whose order differs between a directory walk and a listing: '-' < '.' < '/' < '0'
+FILES = {'a-b.txt': b'1', 'a.txt': b'22', 'a/b.txt': b'333', 'a/c/d.txt': b'4444', 'a0.txt': b'55555'}
+
+class SyncTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        self.file_path = os.path.join(self.tmp_path, 'files')
+        os.makedirs(self.file_path)
+
+    def write_files(self, files):
+        for file_name, data in files.items():
+            self.write_file(os.path.join('files', *file_name.split('/')), data)
+
+    def get_file_names(self):
+        return sorted(os.path.relpath(os.path.join(root, name), self.file_path).replace(os.sep, '/') for root, dirs, files in os.walk(self.file_path) for name in files)
+
+    def get_key_names(self):
+        return sorted(key.name for key in self.bucket.list())
+
+    def assert_stats(self, response, num_transferred, num_skipped, num_deleted = 0):
+        self.assertTrue(response['is_synced'], response['errors'])
+        self.assertEqual((response['num_transferred'], response['num_skipped'], response['num_deleted']), (num_transferred, num_skipped, num_deleted))
+
+    def test_walk_key_names(self):
+        self.write_files(FILES)
+        os.makedirs(os.path.join(self.file_path, 'empty'))
+        self.assertEqual(list(s3helper.walk_key_names(self.file_path)), ['a-b.txt', 'a.txt', 'a/b.txt', 'a/c/d.txt', 'a0.txt'])
+
+    def test_upload(self):
+        self.write_files(FILES)
+        self.assert_stats(s3helper.sync_upload(self.conn_res, self.bucket_name, self.file_path, 'sync'), len(FILES), 0)
+        self.assertEqual(self.get_key_names(), sorted('sync/' + file_name for file_name in FILES))
+        self.assert_stats(s3helper.sync_upload(self.conn_res, self.bucket_name, self.file_path, 'sync'), 0, len(FILES))
+
+    def test_upload_changed(self):
+        self.write_files(FILES)
+        s3helper.sync_upload(self.conn_res, self.bucket_name, self.file_path, 'sync')
+        self.write_files({'a/b.txt': b'changed', 'new.txt': b'new'})
+        future = time.time() + 3600
+        os.utime(os.path.join(self.file_path, 'a0.txt'), (future, future))
+        self.assert_stats(s3helper.sync_upload(self.conn_res, self.bucket_name, self.file_path, 'sync'), 3, len(FILES) - 2)
+        self.assertEqual(self.bucket.get_key('sync/a/b.txt').get_contents_as_string(), b'changed')
+
+    def test_upload_delete(self):
+        self.write_files(FILES)
+        self.put('sync/a/stale.txt', b'stale')
+        self.put('other.txt', b'other')
+        self.assert_stats(s3helper.sync_upload(self.conn_res, self.bucket_name, self.file_path, 'sync'), len(FILES), 0)
+        self.assertIn('sync/a/stale.txt', self.get_key_names())
+        self.assert_stats(s3helper.sync_upload(self.conn_res, self.bucket_name, self.file_path, 'sync', delete = True), 0, len(FILES), 1)
+        self.assertEqual(self.get_key_names(), sorted(['other.txt'] + ['sync/' + file_name for file_name in FILES]))
+
+    def test_download(self):
+        for file_name, data in FILES.items():
+            self.put('sync/' + file_name, data)
+        self.assert_stats(s3helper.sync_download(self.conn_res, self.bucket_name, self.file_path, 'sync'), len(FILES), 0)
+        self.assertEqual(self.get_file_names(), sorted(FILES))
+        self.assertEqual(self.read_file(os.path.join(self.file_path, 'a', 'c', 'd.txt')), b'4444')
+        self.assert_stats(s3helper.sync_download(self.conn_res, self.bucket_name, self.file_path, 'sync'), 0, len(FILES))
+
+    def test_download_changed(self):
+        for file_name, data in FILES.items():
+            self.put('sync/' + file_name, data)
+        s3helper.sync_download(self.conn_res, self.bucket_name, self.file_path, 'sync')
+        self.put('sync/a/b.txt', b'changed')
+        self.put('sync/new.txt', b'new')
+        self.assert_stats(s3helper.sync_download(self.conn_res, self.bucket_name, self.file_path, 'sync'), 2, len(FILES) - 1)
+        self.assertEqual(self.read_file(os.path.join(self.file_path, 'a', 'b.txt')), b'changed')
+
+    ## local files are deleted only with delete, and only those that are not listed under the prefix
+    def test_download_delete(self):
+        for file_name, data in FILES.items():
+            self.put('sync/' + file_name, data)
+        self.write_files({'a/stale.txt': b'stale', 'b.txt': b'b'})
+        self.assert_stats(s3helper.sync_download(self.conn_res, self.bucket_name, self.file_path, 'sync'), len(FILES), 0)
+        self.assertEqual(self.get_file_names(), sorted(list(FILES) + ['a/stale.txt', 'b.txt']))
+        self.assert_stats(s3helper.sync_download(self.conn_res, self.bucket_name, self.file_path, 'sync', delete = True), 0, len(FILES), 2)
+        self.assertEqual(self.get_file_names(), sorted(FILES))
+
+    def test_download_missing_bucket(self):
+        response = s3helper.sync_download(self.conn_res, self.bucket_name + '-missing', self.file_path, 'sync', delete = True)
+        self.assertFalse(response['is_synced'])
+        self.assertEqual(response['num_deleted'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
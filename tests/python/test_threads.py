@@ -0,0 +1,33 @@
+import threading
+import unittest
+
+from s3test import s3helper
+
+def count(limit):
+    for index in range(limit):
+        yield index
+
+class MapInThreadsTest(unittest.TestCase):
+    def test_results_are_ordered(self):
+        results = list(s3helper.map_in_threads(lambda item: item * 2, count(1000), max_workers = 4, max_pending = 10))
+        self.assertEqual(results, [index * 2 for index in range(1000)])
+
+    def test_error_of_items_is_raised(self):
+        def failing():
+            yield 1
+            raise ValueError('listing failed')
+        with self.assertRaises(ValueError):
+            list(s3helper.map_in_threads(lambda item: item, failing(), max_workers = 2))
+
+    ## the feeder is blocked on max_pending when the consumer stops, closing must not wait for it
+    def test_close_early(self):
+        results = s3helper.map_in_threads(lambda item: item, count(100000), max_workers = 4, max_pending = 10)
+        self.assertEqual([next(results) for _ in range(5)], [0, 1, 2, 3, 4])
+        closing = threading.Thread(target = results.close)
+        closing.daemon = True
+        closing.start()
+        closing.join(10)
+        self.assertFalse(closing.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import io
+import os
+import unittest
+
+import boto
+from boto.s3.key import Key
+from boto.s3.multipart import MultiPartUpload
+
+from s3test import S3TestCase, patch, s3helper
+
+MB = 1024 * 1024
+
+class ETagVerificationTest(S3TestCase):
+    def setUp(self):
+        S3TestCase.setUp(self)
+        self.data = os.urandom(11 * MB + 123)
+        self.write_file('big.bin', self.data)
+
+    def upload(self):
+        response = s3helper.upload_file(self.conn_res, self.bucket_name, self.tmp_path, 'big.bin', 'v', multipart_threshold = 5 * MB, part_size = 5 * MB)
+        self.assertTrue(response['is_uploaded'], response['message'])
+        return response['key_name']
+
+    ## a part whose contents are corrupted on the way is uploaded again on its own
+    def test_upload_corrupted_part(self):
+        part_nums = []
+        def upload_part_from_file(mp, fp, part_num, *args, **kwargs):
+            part_nums.append(part_num)
+            if part_num == 2 and part_nums.count(2) == 1:
+                data = fp.read()
+                fp = io.BytesIO(b'X' + data[1:])
+            return original(mp, fp, part_num, *args, **kwargs)
+        original = patch(self, MultiPartUpload, 'upload_part_from_file', upload_part_from_file)
+        key_name = self.upload()
+        self.assertEqual(sorted(part_nums), [1, 2, 2, 3])
+        self.assertTrue(self.bucket.get_key(key_name).etag.strip('"').endswith('-3'))
+
+    ## S3 checks the Content-MD5 of a part and rejects one that is corrupted or cut short with a 400 error
+    def test_upload_rejected_parts(self):
+        part_nums = []
+        errors = {2: 'BadDigest', 3: 'IncompleteBody'}
+        def upload_part_from_file(mp, fp, part_num, *args, **kwargs):
+            part_nums.append(part_num)
+            if part_num in errors and part_nums.count(part_num) == 1:
+                body = '<?xml version="1.0" encoding="UTF-8"?><Error><Code>{0}</Code><Message>rejected</Message></Error>'.format(errors[part_num])
+                raise boto.exception.S3ResponseError(400, 'Bad Request', body)
+            return original(mp, fp, part_num, *args, **kwargs)
+        original = patch(self, MultiPartUpload, 'upload_part_from_file', upload_part_from_file)
+        key_name = self.upload()
+        self.assertEqual(sorted(part_nums), [1, 2, 2, 3, 3])
+        self.assertEqual(self.bucket.get_key(key_name).get_contents_as_string(), self.data)
+
+    ## ranges are aligned to the parts of the upload so that the composite ETag can be computed
+    def test_download_ranges_of_multipart_key(self):
+        key_name = self.upload()
+        response = s3helper.download_file(self.get_key_response(key_name), key_name, self.tmp_path, multipart_threshold = 1, part_size = MB, max_workers = 3)
+        self.assertTrue(response['is_downloaded'], response['message'])
+        self.assertEqual(self.read_file(os.path.join(self.tmp_path, response['file_name'])), self.data)
+
+    def test_download_short_range(self):
+        key_name = self.upload()
+        short = []
+        def get_file(key, fp, headers = None, *args, **kwargs):
+            original(key, fp, headers, *args, **kwargs)
+            if headers is not None and 'Range' in headers and len(short) == 0:
+                short.append(headers['Range'])
+                fp.seek(fp.tell() - 10)
+        original = patch(self, Key, 'get_file', get_file)
+        response = s3helper.download_file(self.get_key_response(key_name), key_name, self.tmp_path, multipart_threshold = 1, max_workers = 2)
+        self.assertTrue(response['is_downloaded'], response['message'])
+        self.assertEqual(len(short), 1)
+        self.assertEqual(self.read_file(os.path.join(self.tmp_path, response['file_name'])), self.data)
+
+    ## the part size is looked up before the retried GET, which must not wait for a second request slot
+    def test_download_without_nested_calls(self):
+        key_name = self.upload()
+        depth, max_depth = [0], [0]
+        def call_with_retry(phase, func, *args, **kwargs):
+            depth[0] += 1
+            max_depth[0] = max(max_depth[0], depth[0])
+            try:
+                return original(phase, func, *args, **kwargs)
+            finally:
+                depth[0] -= 1
+        original = patch(self, s3helper, 'call_with_retry', call_with_retry)
+        response = s3helper.download_file(self.get_key_response(key_name), key_name, self.tmp_path)
+        self.assertTrue(response['is_downloaded'], response['message'])
+        self.assertEqual(max_depth[0], 1)
+
+    ## every attempt is verified with a new digest
+    def test_download_corrupted_once(self):
+        key_name = self.upload()
+        attempts = []
+        def open_read(key, *args, **kwargs):
+            if key.resp is None:
+                attempts.append(key.name)
+            return original_open_read(key, *args, **kwargs)
+        def read(key, size = 0):
+            data = original_read(key, size)
+            return b'Z' + data[1:] if data and len(attempts) == 1 else data
+        original_open_read = patch(self, Key, 'open_read', open_read)
+        original_read = patch(self, Key, 'read', read)
+        response = s3helper.download_file(self.get_key_response(key_name), key_name, self.tmp_path)
+        self.assertTrue(response['is_downloaded'], response['message'])
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.read_file(os.path.join(self.tmp_path, response['file_name'])), self.data)
+
+    def test_download_corrupted_stream(self):
+        key_name = self.upload()
+        def read(key, size = 0):
+            data = original(key, size)
+            return b'Z' + data[1:] if data else data
+        original = patch(self, Key, 'read', read)
+        patch(self, s3helper, 'RETRY_MAX_ATTEMPTS', 2)
+        response = s3helper.download_file(self.get_key_response(key_name), key_name, self.tmp_path)
+        self.assertFalse(response['is_downloaded'])
+        self.assertTrue(response['message'].startswith('S3DataError'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import json
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from s3test import S3TestCase, patch, s3helper
+
+## requests are written to a file that serve_worker and run_manifest read as their input stream
+def write_requests(lines):
+    instream = tempfile.TemporaryFile('w+')
+    instream.write(''.join(line + '\n' for line in lines))
+    instream.seek(0)
+    return instream
+
+def read_responses(outstream):
+    outstream.seek(0)
+    lines = outstream.read().split('\n')
+    assert lines[-1] == '', 'response is not terminated by a newline'
+    return [json.loads(line) for line in lines[:-1]]
+
+def request(op, **args):
+    return json.dumps({'op': op, 'args': args})
+
+class ServeWorkerTest(S3TestCase):
+    def serve(self, lines):
+        instream, outstream = write_requests(lines), tempfile.TemporaryFile('w+')
+        self.addCleanup(instream.close)
+        self.addCleanup(outstream.close)
+        s3helper.serve_worker(self.conn_res, instream, outstream)
+        return read_responses(outstream)
+
+    ## one response line per request in order, blank lines are skipped and nothing is read after shutdown
+    def test_requests(self):
+        self.put('a.txt', b'a')
+        responses = self.serve([
+            request('lookup_bucket', bucket_name = self.bucket_name),
+            '',
+            request('lookup_key', bucket_name = self.bucket_name, key_name = 'a.txt'),
+            request('lookup_key', bucket_name = self.bucket_name, key_name = 'missing.txt'),
+            json.dumps({'op': 'shutdown'}),
+            request('lookup_bucket', bucket_name = self.bucket_name)
+        ])
+        self.assertEqual(len(responses), 4)
+        self.assertTrue(responses[0]['is_exists'])
+        self.assertEqual((responses[1]['key_name'], responses[1]['is_exists']), ('a.txt', True))
+        self.assertEqual((responses[2]['key_name'], responses[2]['is_exists']), ('missing.txt', False))
+        self.assertEqual(responses[3], {'op': 'shutdown', 'message': None})
+
+    ## an error is the response of its request only, later requests are served
+    def test_request_errors(self):
+        responses = self.serve([
+            '{"op": "lookup_bucket"',
+            '["lookup_bucket"]',
+            request('no_such_operation'),
+            request('stream_key', bucket_name = self.bucket_name, key_name = 'a.txt'),
+            request('lookup_key', bucket_name = self.bucket_name),
+            request('generate_url', bucket_name = self.bucket_name, key_name = 'a.txt', seconds = 'soon'),
+            request('lookup_bucket', bucket_name = self.bucket_name)
+        ])
+        self.assertEqual(len(responses), 7)
+        self.assertTrue(responses[0]['message'].startswith('invalid request: '))
+        self.assertTrue(responses[1]['message'].startswith('invalid request: '))
+        self.assertEqual(responses[2], {'op': 'no_such_operation', 'message': 'unknown operation'})
+        self.assertEqual(responses[3], {'op': 'stream_key', 'message': 'unknown operation'})
+        self.assertEqual(responses[4], {'op': 'lookup_key', 'message': 'missing argument: key_name'})
+        self.assertTrue(responses[5]['message'].startswith('invalid argument: '))
+        self.assertTrue(responses[6]['is_exists'])
+
+    ## an argument of 0 is passed as is, not replaced by its default
+    def test_zero_argument(self):
+        for key_name in ['a/1', 'a/2', 'b/1']:
+            self.put(key_name, b'x')
+        responses = self.serve([request('get_prefix_usage', bucket_name = self.bucket_name, depth = 0), request('get_prefix_usage', bucket_name = self.bucket_name)])
+        self.assertEqual([(group['prefix'], group['depth'], group['num_keys']) for group in responses[0]], [('', 0, 3)])
+        self.assertEqual(sorted((group['prefix'], group['num_keys']) for group in responses[1]), [('', 3), ('a/', 2), ('b/', 1)])
+
+    def test_metrics(self):
+        patch(self, s3helper, 'metrics', None)
+        s3helper.enable_metrics()
+        responses = self.serve([request('lookup_bucket', bucket_name = self.bucket_name)])
+        self.assertTrue(responses[0]['response']['is_exists'])
+        self.assertIn('seconds', responses[0]['metrics'])
+
+## the worker prints the port that it listens on to stdout
+class PortWriter(object):
+    def __init__(self):
+        self.lines = []
+
+    def write(self, data):
+        self.lines.append(data)
+
+    def flush(self):
+        pass
+
+    def get_port(self, timeout = 10):
+        start = time.time()
+        while time.time() - start < timeout:
+            text = ''.join(self.lines)
+            if text.endswith('\n'):
+                return int(text)
+            time.sleep(0.01)
+        return None
+
+class ServeWorkerSocketTest(S3TestCase):
+    def test_socket(self):
+        writer = PortWriter()
+        patch(self, s3helper.sys, 'stdout', writer)
+        worker = threading.Thread(target = s3helper.serve_worker_socket, args = (self.conn_res, 0))
+        worker.daemon = True
+        worker.start()
+        port = writer.get_port()
+        self.assertIsNotNone(port)
+        client = socket.create_connection(('127.0.0.1', port), 10)
+        instream, outstream = client.makefile('r'), client.makefile('w')
+        try:
+            responses = []
+            for line in [request('lookup_bucket', bucket_name = self.bucket_name), request('no_such_operation'), json.dumps({'op': 'shutdown'})]:
+                outstream.write(line + '\n')
+                outstream.flush()
+                responses.append(json.loads(instream.readline()))
+        finally:
+            instream.close()
+            outstream.close()
+            client.close()
+        worker.join(10)
+        self.assertFalse(worker.is_alive())
+        self.assertTrue(responses[0]['is_exists'])
+        self.assertEqual(responses[1]['message'], 'unknown operation')
+        self.assertEqual(responses[2]['op'], 'shutdown')
+
+class RunManifestTest(S3TestCase):
+    def run_manifest(self, lines, max_workers, ordered):
+        instream, outstream = write_requests(lines), tempfile.TemporaryFile('w+')
+        self.addCleanup(instream.close)
+        self.addCleanup(outstream.close)
+        cnt = s3helper.run_manifest(self.conn_res, instream, outstream, max_workers, ordered)
+        results = read_responses(outstream)
+        self.assertEqual(cnt, len(results))
+        return results
+
+    def get_lines(self):
+        for index in range(10):
+            self.put('k{0}'.format(index), b'x')
+        lines = [request('lookup_key', bucket_name = self.bucket_name, key_name = 'k{0}'.format(index)) for index in range(10)]
+        return lines[:3] + ['', 'not json'] + lines[3:]
+
+    ## index is the line number of the request in the manifest
+    def test_input_order(self):
+        results = self.run_manifest(self.get_lines(), 4, True)
+        self.assertEqual([result['index'] for result in results], [1, 2, 3] + list(range(5, 13)))
+        self.assertTrue(results[3]['response']['message'].startswith('invalid request: '))
+        self.assertEqual([result['response']['key_name'] for result in results if result['op'] == 'lookup_key'], ['k{0}'.format(index) for index in range(10)])
+        self.assertTrue(all(result['response']['is_exists'] for result in results if result['op'] == 'lookup_key'))
+
+    def test_completion_order(self):
+        results = self.run_manifest(self.get_lines(), 4, False)
+        self.assertEqual(sorted(result['index'] for result in results), [1, 2, 3] + list(range(5, 13)))
+
+if __name__ == '__main__':
+    unittest.main()